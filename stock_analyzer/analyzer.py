@@ -1,234 +1,366 @@
 """
 主要分析逻辑
+
+所有下载都经过 provider (见 providers 模块), 默认为 Yahoo Finance;
+yfinance 只在第一次需要下载数据时导入, 行情和基本面都命中缓存时不会加载它。
+每次调用都有时限 (config.PROVIDER_TIMEOUTS), 基本面和行情同时下载。
+各阶段 (下载、缓存、指标计算...) 的耗时记录在当前的 instrumentation.trace 中,
+数据源调用耗时、错误、缓存命中率和计算耗时同时计入 metrics 模块的运行指标。
 """
 
-import yfinance as yf
+import os
+import time
+import threading
+import contextvars
 import pandas as pd
-import numpy as np
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import streamlit as st
 
-from config import COMPANIES, TEAM_MEMBERS, TECHNICAL_EXPLANATIONS, FUNDAMENTAL_EXPLANATIONS
+from config import (
+    COMPANIES, TEAM_MEMBERS, TECHNICAL_EXPLANATIONS, FUNDAMENTAL_EXPLANATIONS,
+    HISTORY_INTERVAL, HISTORY_PERIOD, BATCH_INFO_WORKERS, DEFAULT_COLOR,
+    TECHNICAL_PARAMS, SCORE_WEIGHTS, TIMEFRAMES, PROVIDER_WORKERS, PROVIDER_TIMEOUTS
+)
+from indicators import MIN_BARS, empty_technical_result, latest_technical_results, required_bars
+from cache import HistoryCache, FundamentalsCache, ResultCache, SingleFlight
+from resampling import resample_ohlcv
+from providers import default_provider, storage_dirs
+from instrumentation import span, timed
+from metrics import ANALYSIS_SECONDS, FETCH_SECONDS, UPSTREAM_ERRORS, cache_result
+
+# 进程内所有 StockAnalyzer 共享的线程池 (线程在第一次提交任务时才创建, 不随分析器实例增加)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _reset_pools_after_fork():
+    """fork 出的子进程 (如 batch.py 的工作进程) 没有父进程的线程, 需要重新创建线程池"""
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def shared_pool(name):
+    """名为 name 的共享线程池 (最多 PROVIDER_WORKERS 个线程)"""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=PROVIDER_WORKERS, thread_name_prefix=name)
+        return pool
+
 
 class StockAnalyzer:
-    def __init__(self):
+    def __init__(self, result_cache=None, results_store=None, panel_store=None, score_history=None,
+                 provider=None, cache_dir=None):
         self.companies = COMPANIES
         self.team_members = TEAM_MEMBERS
         self.technical_explanations = TECHNICAL_EXPLANATIONS
         self.fundamental_explanations = FUNDAMENTAL_EXPLANATIONS
+        self.technical_params = TECHNICAL_PARAMS
+        self.score_weights = SCORE_WEIGHTS
+        # 行情和基本面缓存的目录, 默认为 CACHE_DIR (回放模式下为专用目录, 见 providers.storage_dirs)
+        cache_dir = cache_dir or storage_dirs()[0]
+        self.history_cache = HistoryCache(cache_dir)
+        self.fundamentals_cache = FundamentalsCache(cache_dir)
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.results_store = results_store
+        self.panel_store = panel_store
+        self.score_history = score_history
+        # 行情和基本面的数据源, 默认见 providers.default_provider
+        self.provider = provider if provider is not None else default_provider()
+        self._inflight = SingleFlight()
+        # provider 调用在 _calls 中执行 (以便设置时限); 与行情并发的基本面阶段在 _stages 中执行。
+        # _calls 中的任务不再提交新任务, 两个池分开以避免互相等待造成死锁
+        self._calls = shared_pool("provider")
+        self._stages = shared_pool("fundamentals")
 
-    def get_stock_data(self, ticker):
-        """获取股票数据"""
+    @timed()
+    def get_stock_data(self, ticker, force_refresh=False, interval=HISTORY_INTERVAL):
+        """获取股票数据
+
+        interval 为 config.TIMEFRAMES 中的K线周期; 只下载并缓存该周期的 source 周期,
+        需要时在本地聚合 (例如 15m 和 1h 共用同一份 5m 缓存)。
+        基本面和行情同时获取, 延迟为两者中较慢的一个; 多个会话同时请求同一个 ticker 时只向数据源发起一次下载。
+        """
+        return self._inflight.do(
+            ('data', ticker, interval, force_refresh),
+            lambda: self._fetch_stock_data(ticker, force_refresh, interval)
+        )
+
+    def _fetch_stock_data(self, ticker, force_refresh, interval=HISTORY_INTERVAL):
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
-            hist = stock.history(period="6mo")
+            timeframe = TIMEFRAMES[interval]
+            source = timeframe['source']
+            fetched = []
+            # 在调用者的 contextvars 上下文中执行, 基本面阶段 (及其 provider.info) 计入当前的 trace
+            info_future = self._stages.submit(
+                contextvars.copy_context().run, self._fetch_info, ticker, fetched, force_refresh
+            )
+            # 指标需要 required_bars 根K线预热; 聚合后的一根K线约等于 rule / source 根原始K线
+            min_bars = required_bars(self.technical_params)
+            if timeframe['rule'] is not None:
+                min_bars *= int(pd.Timedelta(timeframe['rule']) / pd.Timedelta(source))
+            with span("history", interval=source):
+                full_hist = self.history_cache.get_history(
+                    ticker,
+                    self._fetcher('history', ticker, fetched, interval=source),
+                    interval=source,
+                    period=timeframe['period'],
+                    force=force_refresh,
+                    min_bars=min_bars
+                )
+            cache_result('history', 'history' not in fetched)
+            if timeframe['rule'] is not None:
+                with span("resample", rule=timeframe['rule']):
+                    full_hist = resample_ohlcv(full_hist, timeframe['rule'])
+            hist = self.history_cache.window(full_hist, timeframe['period'])
+            info = info_future.result()
+            cache_result('fundamentals', 'info' not in fetched)
             
             return {
                 'info': info,
                 'hist': hist,
+                'full_hist': full_hist,
+                'as_of': self.data_as_of(ticker, hist),
                 'success': True
             }
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def fetch_many(self, tickers, force_refresh=False, interval=HISTORY_INTERVAL):
+        """并发获取多个 ticker 的 get_stock_data 结果, 返回 {ticker: data}
+
+        与 fetch_universe 不同, 每个 ticker 单独下载, 因而支持所有 TIMEFRAMES 周期;
+        日线的大股票池仍以 fetch_universe 的批量下载为宜。
+        """
+        tickers = list(dict.fromkeys(tickers))
+        with ThreadPoolExecutor(max_workers=BATCH_INFO_WORKERS) as executor:
+            futures = {
+                ticker: executor.submit(self.get_stock_data, ticker, force_refresh, interval)
+                for ticker in tickers
+            }
+            return {ticker: future.result() for ticker, future in futures.items()}
+
+    @timed()
+    def fetch_universe(self, tickers=None, force_refresh=False):
+        """批量获取多个 ticker 的行情和基本面数据
+
+        行情通过一次批量下载获取 (只包含缓存已过期的 ticker), stock.info 在有界线程池中并发获取。
+        tickers 默认为 COMPANIES 中的全部公司。返回:
+            'prices': 按日期对齐的 DataFrame, 列为 (字段, ticker) 的 MultiIndex, 如 prices['Close'];
+                      每个 ticker 包含 HISTORY_PERIOD 的行情, 且至少有指标预热需要的K线数
+            'info':   {ticker: info}
+            'errors': {ticker: 错误信息}
+        设置了 panel_store 时, 下载的行情同时写入该价格面板。
+        """
+        if tickers is None:
+            tickers = [company['ticker'] for company in self.companies.values()]
+        tickers = list(dict.fromkeys(tickers))
+
+        return self._inflight.do(
+            ('universe', tuple(tickers), force_refresh),
+            lambda: self._fetch_universe(tickers, force_refresh)
+        )
+
+    def _fetch_universe(self, tickers, force_refresh):
+        errors = {}
+        infos = {}
+
+        with ThreadPoolExecutor(max_workers=BATCH_INFO_WORKERS) as executor:
+            info_futures = {
+                ticker: executor.submit(self._get_info, ticker, force_refresh)
+                for ticker in tickers
+            }
+            histories = self._download_histories(tickers, force_refresh, errors)
+
+            for ticker, future in info_futures.items():
+                try:
+                    infos[ticker] = future.result()
+                except Exception as e:
+                    errors.setdefault(ticker, str(e))
+
+        frames = {ticker: hist for ticker, hist in histories.items() if not hist.empty}
+        if frames:
+            prices = pd.concat(frames, axis=1, sort=True).swaplevel(axis=1).sort_index(axis=1)
+        else:
+            prices = pd.DataFrame()
+
+        if self.panel_store is not None and not prices.empty:
+            self.panel_store.append(prices)
+
+        return {'prices': prices, 'info': infos, 'errors': errors}
+
+    def _provider_call(self, method, *args, **kwargs):
+        """调用 provider 的方法, 耗时记为 provider.<method> 阶段并计入 FETCH_SECONDS
+
+        运行超过 PROVIDER_TIMEOUTS[method] 秒时抛出 TimeoutError (调用本身无法中断, 会在后台线程中结束);
+        时限从工作线程开始执行调用时算起, 在共享线程池中排队等待的时间不计入。
+        批量下载 (download) 的 ticker 标签为 "*"; 抛出异常或超时的调用计入 UPSTREAM_ERRORS。
+        """
+        ticker = args[0] if args and isinstance(args[0], str) else "*"
+        timeout = PROVIDER_TIMEOUTS.get(method)
+        started = []
+        started_event = threading.Event()
+
+        def call():
+            started.append(time.monotonic())
+            started_event.set()
+            return getattr(self.provider, method)(*args, **kwargs)
+
+        with span(f"provider.{method}"), FETCH_SECONDS.labels(method, ticker).time():
+            future = self._calls.submit(call)
+            try:
+                if timeout is not None:
+                    started_event.wait()
+                    timeout_left = max(timeout - (time.monotonic() - started[0]), 0)
+                    return future.result(timeout=timeout_left)
+                return future.result()
+            except FutureTimeoutError:
+                future.cancel()
+                UPSTREAM_ERRORS.labels(method).inc()
+                raise TimeoutError(f"Délai dépassé ({timeout} s) pour {method} {ticker}") from None
+            except Exception:
+                UPSTREAM_ERRORS.labels(method).inc()
+                raise
+
+    def _fetch_info(self, ticker, fetched, force_refresh):
+        """基本面阶段: 与 _fetch_stock_data 的行情下载并发执行"""
+        with span("fundamentals"):
+            return self.fundamentals_cache.get_info(
+                ticker, self._fetcher('info', ticker, fetched), force=force_refresh
+            )
+
+    def _fetcher(self, method, ticker, fetched, **fixed):
+        """返回调用 provider.<method>(ticker) 的函数, 供缓存在需要下载时调用
+
+        每次调用把 method 追加到 fetched, 调用者据此判断缓存是否命中。
+        """
+        def fetch(**kwargs):
+            fetched.append(method)
+            return self._provider_call(method, ticker, **fixed, **kwargs)
+        return fetch
+
+    def _get_info(self, ticker, force_refresh=False):
+        return self._inflight.do(
+            ('info', ticker, force_refresh),
+            lambda: self._cached_info(ticker, force_refresh)
+        )
+
+    def _cached_info(self, ticker, force_refresh):
+        fetched = []
+        info = self.fundamentals_cache.get_info(
+            ticker, self._fetcher('info', ticker, fetched), force=force_refresh
+        )
+        cache_result('fundamentals', 'info' not in fetched)
+        return info
+
+    @staticmethod
+    def _downloaded_frame(downloaded, ticker):
+        """provider.download 结果中一个 ticker 的K线, 没有数据时返回 None"""
+        if downloaded is None or ticker not in downloaded.columns.get_level_values(0):
+            return None
+        frame = downloaded[ticker].dropna(subset=['Close'])
+        frame.columns.name = None
+        return frame
+
+    def _download(self, tickers, **kwargs):
+        try:
+            return self._provider_call('download', tickers, interval=HISTORY_INTERVAL, **kwargs)
+        except Exception as e:
+            print(f"Erreur téléchargement groupé: {e}")
+            return None
+
+    def _download_histories(self, tickers, force_refresh, errors):
+        """一次批量下载 (provider.download) 获取所有过期 ticker 的新K线并写入缓存
+
+        K线不足指标预热需要的数量时, 再批量下载一次向前补充 (只下载缺少的日期区间)。
+        """
+        histories = {}
+        cold = []
+        stale = {}
+        for ticker in tickers:
+            cached = self.history_cache.load(ticker)
+            if cached is None or cached.empty:
+                cold.append(ticker)
+            elif force_refresh or not self.history_cache.is_fresh(ticker):
+                stale[ticker] = cached
+            else:
+                histories[ticker] = cached
+            cache_result('history', ticker in histories)
+
+        batches = []
+        if cold:
+            batches.append((cold, {'period': HISTORY_PERIOD}))
+        if stale:
+            start = min(self.history_cache.resume_date(cached) for cached in stale.values())
+            batches.append((list(stale), {'start': start}))
+
+        for batch, kwargs in batches:
+            downloaded = self._download(batch, **kwargs)
+
+            for ticker in batch:
+                cached = stale.get(ticker)
+                new_data = self._downloaded_frame(downloaded, ticker)
+
+                if (new_data is None or new_data.empty) and cached is None:
+                    errors[ticker] = "Aucune donnée de cours disponible"
+                    continue
+
+                histories[ticker] = self.history_cache.update(ticker, new_data, cached=cached)
+
+        min_bars = required_bars(self.technical_params)
+        short = [
+            ticker for ticker, hist in histories.items()
+            if self.history_cache.needs_backfill(ticker, hist, min_bars)
+        ]
+        if short:
+            ranges = [self.history_cache.backfill_range(histories[ticker], min_bars) for ticker in short]
+            downloaded = self._download(
+                short, start=min(start for start, _ in ranges), end=max(end for _, end in ranges)
+            )
+            for ticker in short:
+                older = self._downloaded_frame(downloaded, ticker)
+                histories[ticker] = self.history_cache.backfill(
+                    ticker, histories[ticker], min_bars, lambda **kwargs: older
+                )
+
+        return {
+            ticker: self.history_cache.window(hist, min_bars=min_bars)
+            for ticker, hist in histories.items()
+        }
+
+    def data_as_of(self, ticker, hist):
+        """数据时间戳: 最后一根K线的时间 + 基本面数据的下载时间"""
+        last_bar = hist.index[-1].isoformat() if not hist.empty else None
+        return (last_bar, self.fundamentals_cache.fetched_at(ticker))
+
+    @timed()
     def calculate_technical_indicators(self, hist_data):
-        """计算完整的技术指标"""
-        if hist_data.empty or len(hist_data) < 50:
-            return {'total_score': 0, 'detailed_scores': {}, 'metrics': {}, 'signals': {}}
-        
-        scores = {}
-        signals = {}
-        detailed_metrics = {}
+        """计算完整的技术指标
+
+        hist_data 可以是任意周期的K线 (日线或日内), 所有窗口都按K线根数计算。
+        RSI、移动平均线、MACD、布林带和动量由 indicators 模块的向量化引擎计算,
+        多个 ticker 可直接使用 indicators.latest_technical_results 一次完成。
+        结果中的 'series' 保存完整的指标序列, 图表直接复用, 不再重新计算。
+        """
+        if hist_data.empty or len(hist_data) < MIN_BARS:
+            return empty_technical_result()
         
         try:
-            current_price = hist_data['Close'].iloc[-1]
-            
-            # 1. RSI计算
-            delta = hist_data['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            rsi = 100 - (100 / (1 + rs))
-            current_rsi = rsi.iloc[-1] if not rsi.empty and not pd.isna(rsi.iloc[-1]) else 50
-            
-            # RSI评分和信号 - 修复版本
-            if current_rsi < 30:
-                rsi_score = 5
-                rsi_signal = "🟢 FORT SURVENDU - Signal d'achat potentiel"
-            elif current_rsi < 40:
-                rsi_score = 4  
-                rsi_signal = "🟡 SURVENDU - Opportunité d'achat modérée"
-            elif current_rsi < 60:
-                rsi_score = 3
-                rsi_signal = "⚪ NEUTRE - Pas de signal directionnel clair"
-            elif current_rsi < 70:
-                rsi_score = 2
-                rsi_signal = "🟠 SURACHETÉ - Prudence recommandée"
-            else:
-                rsi_score = 1
-                rsi_signal = "🔴 FORT SURACHETÉ - Signal de vente potentiel"
-            
-            scores['rsi'] = rsi_score
-            signals['rsi'] = rsi_signal
-            detailed_metrics['rsi'] = round(current_rsi, 1)
-            
-            # 2. 移动平均线计算
-            ma_20 = hist_data['Close'].rolling(window=20).mean().iloc[-1]
-            ma_50 = hist_data['Close'].rolling(window=50).mean().iloc[-1]
-            ma_200 = hist_data['Close'].rolling(window=200).mean().iloc[-1] if len(hist_data) >= 200 else ma_50
-            
-            # 移动平均线评分和信号
-            if current_price > ma_20 > ma_50 > ma_200:
-                ma_score = 5
-                ma_signal = "🟢 FORTE TENDANCE HAUSSIÈRE - Configuration optimale"
-            elif current_price > ma_20 > ma_50:
-                ma_score = 4
-                ma_signal = "🟡 TENDANCE HAUSSIÈRE - Signaux positifs"
-            elif ma_20 > ma_50:
-                ma_score = 3
-                ma_signal = "⚪ TENDANCE NEUTRE POSITIVE - Attente de confirmation"
-            elif current_price > ma_50:
-                ma_score = 2
-                ma_signal = "🟠 TENDANCE INCERTAINE - Risques émergents"
-            else:
-                ma_score = 1
-                ma_signal = "🔴 TENDANCE BAISSIÈRE - Configuration défavorable"
-            
-            scores['moving_averages'] = ma_score
-            signals['moving_averages'] = ma_signal
-            detailed_metrics.update({
-                'ma_20': round(ma_20, 2),
-                'ma_50': round(ma_50, 2),
-                'ma_200': round(ma_200, 2),
-                'price_vs_ma20': round(((current_price - ma_20) / ma_20) * 100, 1),
-                'golden_cross': ma_20 > ma_50
-            })
-            
-            # 3. MACD计算
-            exp12 = hist_data['Close'].ewm(span=12, adjust=False).mean()
-            exp26 = hist_data['Close'].ewm(span=26, adjust=False).mean()
-            macd_line = exp12 - exp26
-            macd_signal = macd_line.ewm(span=9, adjust=False).mean()
-            macd_histogram = macd_line - macd_signal
-            
-            current_macd = macd_line.iloc[-1]
-            current_signal = macd_signal.iloc[-1]
-            current_histogram = macd_histogram.iloc[-1]
-            
-            # MACD评分和信号
-            if current_macd > current_signal and current_histogram > 0 and current_macd > 0:
-                macd_score = 5
-                macd_signal = "🟢 FORT SIGNAL HAUSSIER - Momentum accélérant"
-            elif current_macd > current_signal:
-                macd_score = 4
-                macd_signal = "🟡 SIGNAL HAUSSIER - Croisement positif confirmé"
-            elif abs(current_macd - current_signal) < 0.001:
-                macd_score = 3
-                macd_signal = "⚪ TRANSITION - Point d'inflexion potentiel"
-            elif current_macd < current_signal and current_macd > 0:
-                macd_score = 2
-                macd_signal = "🟠 SIGNAL BAISSIER - Momentum décélérant"
-            else:
-                macd_score = 1
-                macd_signal = "🔴 FORT SIGNAL BAISSIER - Momentum négatif fort"
-            
-            scores['macd'] = macd_score
-            signals['macd'] = macd_signal
-            detailed_metrics.update({
-                'macd_line': round(current_macd, 4),
-                'macd_signal': round(current_signal, 4),
-                'macd_histogram': round(current_histogram, 4)
-            })
-            
-            # 4. 布林带计算
-            bb_middle = hist_data['Close'].rolling(window=20).mean()
-            bb_std = hist_data['Close'].rolling(window=20).std()
-            bb_upper = bb_middle + (bb_std * 2)
-            bb_lower = bb_middle - (bb_std * 2)
-            
-            current_bb_upper = bb_upper.iloc[-1]
-            current_bb_lower = bb_lower.iloc[-1]
-            current_bb_middle = bb_middle.iloc[-1]
-            
-            bb_position = (current_price - current_bb_lower) / (current_bb_upper - current_bb_lower)
-            bb_width = (current_bb_upper - current_bb_lower) / current_bb_middle * 100
-            
-            # 布林带评分和信号
-            if bb_position < 0.1:
-                bb_score = 5
-                bb_signal = "🟢 FORT SURVENDU - Rebond probable"
-            elif bb_position < 0.3:
-                bb_score = 4
-                bb_signal = "🟡 SURVENDU MODÉRÉ - Opportunité intéressante"
-            elif bb_position < 0.7:
-                bb_score = 3
-                bb_signal = "⚪ ZONE NEUTRE - Équilibre acheteurs/vendeurs"
-            elif bb_position < 0.9:
-                bb_score = 2
-                bb_signal = "🟠 SURACHETÉ MODÉRÉ - Prudence nécessaire"
-            else:
-                bb_score = 1
-                bb_signal = "🔴 FORT SURACHETÉ - Correction probable"
-            
-            # 波动性分析
-            if bb_width < 8:
-                bb_signal += " | 📏 FAIBLE VOLATILITÉ (Compression - mouvement imminent)"
-            elif bb_width > 20:
-                bb_signal += " | 🌊 FORTE VOLATILITÉ (Expansion - mouvement en cours)"
-            else:
-                bb_signal += " | 📊 VOLATILITÉ NORMALE"
-            
-            scores['bollinger_bands'] = bb_score
-            signals['bollinger_bands'] = bb_signal
-            detailed_metrics.update({
-                'bb_position': round(bb_position, 3),
-                'bb_width': round(bb_width, 1),
-                'bb_upper': round(current_bb_upper, 2),
-                'bb_lower': round(current_bb_lower, 2),
-                'bb_middle': round(current_bb_middle, 2)
-            })
-            
-            # 5. 动量计算
-            price_1m_ago = hist_data['Close'].iloc[-22] if len(hist_data) > 22 else hist_data['Close'].iloc[0]
-            price_change = ((current_price - price_1m_ago) / price_1m_ago) * 100
-            
-            if price_change >= 15:
-                momentum_score = 5
-                momentum_signal = "🟢 FORT MOMENTUM HAUSSIER - Accélération"
-            elif price_change >= 8:
-                momentum_score = 4
-                momentum_signal = "🟡 BON MOMENTUM HAUSSIER - Croissance soutenue"
-            elif price_change >= -5:
-                momentum_score = 3
-                momentum_signal = "⚪ MOMENTUM NEUTRE - Stabilité"
-            elif price_change >= -8:
-                momentum_score = 2
-                momentum_signal = "🟠 MOMENTUM BAISSIER - Légère pression"
-            else:
-                momentum_score = 1
-                momentum_signal = "🔴 FORT MOMENTUM BAISSIER - Correction"
-            
-            scores['momentum'] = momentum_score
-            signals['momentum'] = momentum_signal
-            detailed_metrics['price_change_1m'] = round(price_change, 1)
-            
-            # 计算技术分析总分
-            technical_score = sum(scores.values()) / len(scores)
-            
-            detailed_metrics['current_price'] = round(current_price, 2)
-            
-            return {
-                'total_score': round(technical_score, 2),
-                'detailed_scores': scores,
-                'metrics': detailed_metrics,
-                'signals': signals
-            }
+            return latest_technical_results(
+                hist_data[['Close']], with_series=True, params=self.technical_params
+            )['Close']
             
         except Exception as e:
             print(f"Erreur calcul technique: {e}")
-            return {'total_score': 0, 'detailed_scores': {}, 'metrics': {}, 'signals': {}}
+            return empty_technical_result()
 
+    @timed()
     def calculate_fundamental_analysis(self, info):
         """计算完整的基本面分析 - 修复版本"""
         scores = {}
@@ -387,10 +519,18 @@ class StockAnalyzer:
             print(f"Erreur analyse fondamentale: {e}")
             return {'total_score': 0, 'detailed_scores': {}, 'metrics': {}, 'signals': {}}
 
+    def _weighted_score(self, fundamental_score, technical_score):
+        # 权重见 config.SCORE_WEIGHTS (默认基本面60%, 技术面40%)
+        return (fundamental_score * self.score_weights['fundamental']) + \
+            (technical_score * self.score_weights['technical'])
+
+    def combine_scores(self, fundamental_score, technical_score):
+        """总分: 基本面与技术面评分的加权和"""
+        return round(self._weighted_score(fundamental_score, technical_score), 2)
+
     def get_recommendation(self, fundamental_score, technical_score):
         """生成投资建议"""
-        # 权重: 基本面60%, 技术面40%
-        total_score = (fundamental_score * 0.6) + (technical_score * 0.4)
+        total_score = self._weighted_score(fundamental_score, technical_score)
         
         if total_score >= 4.0:
             return "🟢 ACHAT", "Opportunité d'investissement exceptionnelle - Facteurs fondamentaux solides et signaux techniques favorables"
@@ -405,20 +545,65 @@ class StockAnalyzer:
         else:
             return "🔴 VENTE", "Forte recommandation de vente - Risques importants identifiés"
 
-    def run_analysis(self, company_name):
+    @timed()
+    def run_analysis(self, company_name, force_refresh=False, interval=HISTORY_INTERVAL):
         """运行公司分析"""
         if company_name not in self.companies:
             return {"error": "Entreprise non trouvée"}
         
-        ticker = self.companies[company_name]["ticker"]
+        return self.analyze_ticker(
+            self.companies[company_name]["ticker"], force_refresh=force_refresh, interval=interval
+        )
+
+    @timed()
+    def analyze_ticker(self, ticker, force_refresh=False, interval=HISTORY_INTERVAL):
+        """分析任意 ticker, 不在 COMPANIES 中的 ticker 使用 info 中的名称和默认颜色
+
+        技术指标在 interval 周期的K线上计算。结果按 (ticker, 周期, 数据时间戳) 缓存,
+        只有新的行情/基本面数据或 force_refresh 才会重新计算;
+        results_store (预计算结果) 和 score_history (评分历史) 只用于默认的日线周期。
+        """
+        return self._inflight.do(
+            ('analysis', ticker, interval, force_refresh),
+            lambda: self._analyze_ticker(ticker, force_refresh, interval)
+        )
+
+    def _company_profile(self, ticker, info):
+        """公司名称、分析员、描述和颜色"""
+        for company_name, company in self.companies.items():
+            if company['ticker'] == ticker:
+                return company_name, self.team_members[company_name], company['description'], company['color']
         
-        data = self.get_stock_data(ticker)
+        name = info.get('longName') or info.get('shortName') or ticker
+        return name, "—", info.get('sector', ""), DEFAULT_COLOR
+
+    def _analyze_ticker(self, ticker, force_refresh, interval=HISTORY_INTERVAL):
+        data = self.get_stock_data(ticker, force_refresh=force_refresh, interval=interval)
         if not data['success']:
             return {"error": f"Erreur de données: {data.get('error', 'Unknown')}"}
         
+        daily = interval == HISTORY_INTERVAL
+        cache_key = (ticker, interval, data['as_of'])
+        if not force_refresh:
+            cached_result = self.result_cache.get(cache_key)
+            cache_result('result', cached_result is not None)
+            if cached_result is None and daily and self.results_store is not None:
+                cached_result = self.results_store.load(ticker, as_of=data['as_of'])
+                cache_result('results_store', cached_result is not None)
+                if cached_result is not None:
+                    cached_result['hist_data'] = data['hist']
+                    self.result_cache.put(cache_key, cached_result)
+            if cached_result is not None:
+                return cached_result
+        
         # 计算得分
+        start = time.perf_counter()
         fundamental_result = self.calculate_fundamental_analysis(data['info'])
-        technical_result = self.calculate_technical_indicators(data['hist'])
+        # 指标在包含预热K线的完整行情上计算, 图表只显示 data['hist'] 的区间
+        technical_result = self.calculate_technical_indicators(data['full_hist'])
+        series = technical_result.get('series')
+        if series is not None:
+            series = series.iloc[-len(data['hist']):]
         
         # 生成推荐
         recommendation, justification = self.get_recommendation(
@@ -426,18 +611,22 @@ class StockAnalyzer:
             technical_result['total_score']
         )
         
-        total_score = round(
-            (fundamental_result['total_score'] * 0.6) + 
-            (technical_result['total_score'] * 0.4), 2
+        total_score = self.combine_scores(
+            fundamental_result['total_score'],
+            technical_result['total_score']
         )
         
+        company_name, team_member, description, color = self._company_profile(ticker, data['info'])
         result = {
             'company_name': company_name,
             'ticker': ticker,
-            'team_member': self.team_members[company_name],
+            'interval': interval,
+            'team_member': team_member,
             'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'description': self.companies[company_name]["description"],
-            'color': self.companies[company_name]["color"],
+            'data_as_of': data['as_of'][0],
+            'fundamentals_as_of': data['as_of'][1],
+            'description': description,
+            'color': color,
             'current_price': technical_result['metrics'].get('current_price', 0),
             'fundamental_score': fundamental_result['total_score'],
             'technical_score': technical_result['total_score'],
@@ -454,7 +643,15 @@ class StockAnalyzer:
             },
             'fundamental_signals': fundamental_result['signals'],
             'technical_signals': technical_result['signals'],
-            'hist_data': data['hist']
+            'hist_data': data['hist'],
+            'indicator_series': series
         }
         
+        ANALYSIS_SECONDS.labels(interval).observe(time.perf_counter() - start)
+        self.result_cache.put(cache_key, result)
+        with span("store"):
+            if daily and self.results_store is not None:
+                self.results_store.save(result)
+            if daily and self.score_history is not None:
+                self.score_history.append(result)
         return result
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+评分模型的向量化回测
+
+每个历史日期、每个 ticker 的技术评分与 calculate_technical_indicators 的结果相同
+(见 indicators.technical_score_history), 按 get_recommendation 的阈值转换成仓位,
+全部计算都是对 (日期 × ticker) 矩阵的整体运算, 没有按日期的 Python 循环。
+
+注意: yfinance 只提供当前的基本面数据, 回测中基本面评分在整个区间内保持不变
+(有前视偏差); 不提供时使用中性评分 3.0。
+"""
+
+import numpy as np
+import pandas as pd
+
+from indicators import technical_score_history
+from config import (
+    BACKTEST_BUY_THRESHOLD, BACKTEST_SELL_THRESHOLD, TRADING_DAYS_PER_YEAR, SCORE_WEIGHTS
+)
+
+NEUTRAL_FUNDAMENTAL_SCORE = 3.0
+
+
+def performance_metrics(strategy_returns, positions, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """按列计算收益、波动、夏普比率、最大回撤和命中率, 返回 DataFrame (每行一列收益)"""
+    if isinstance(strategy_returns, pd.Series):
+        strategy_returns = strategy_returns.to_frame('portfolio')
+        positions = positions.to_frame('portfolio')
+
+    returns = strategy_returns.fillna(0.0)
+    held = positions.shift(1).fillna(0.0) != 0
+    periods = len(returns)
+
+    equity = (1 + returns).cumprod()
+    total_return = equity.iloc[-1] - 1 if periods else pd.Series(0.0, index=returns.columns)
+    years = periods / periods_per_year
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual_return = (1 + total_return) ** (1 / years) - 1 if years > 0 else total_return * 0
+        volatility = returns.std() * np.sqrt(periods_per_year)
+        sharpe = (returns.mean() * periods_per_year) / volatility
+        hit_rate = ((returns > 0) & held).sum() / held.sum().replace(0, np.nan)
+
+    max_drawdown = (equity / equity.cummax() - 1).min()
+    trades = (positions.fillna(0.0).diff().fillna(positions.fillna(0.0)) != 0).sum()
+
+    return pd.DataFrame({
+        'total_return': total_return,
+        'annual_return': annual_return,
+        'volatility': volatility,
+        'sharpe': sharpe.replace([np.inf, -np.inf], np.nan),
+        'max_drawdown': max_drawdown,
+        'hit_rate': hit_rate,
+        'trades': trades,
+        'exposure': held.mean()
+    })
+
+
+class Backtester:
+    """根据推荐阈值模拟仓位
+
+    - 总分 >= buy_threshold (ACHAT): 做多
+    - 总分 < sell_threshold (VENTE): allow_short 时做空, 否则空仓
+    - 其余 (SURVEILLER / NE RIEN FAIRE): hold_neutral 时保持上一个仓位, 否则空仓
+    信号在收盘时产生, 从下一根K线开始持仓; cost_bps 为每次调仓的交易成本 (基点)。
+    """
+
+    def __init__(self, buy_threshold=BACKTEST_BUY_THRESHOLD, sell_threshold=BACKTEST_SELL_THRESHOLD,
+                 fundamental_weight=SCORE_WEIGHTS['fundamental'],
+                 technical_weight=SCORE_WEIGHTS['technical'], allow_short=False,
+                 hold_neutral=False, cost_bps=0.0, periods_per_year=TRADING_DAYS_PER_YEAR):
+        self.buy_threshold = buy_threshold
+        self.sell_threshold = sell_threshold
+        self.fundamental_weight = fundamental_weight
+        self.technical_weight = technical_weight
+        self.allow_short = allow_short
+        self.hold_neutral = hold_neutral
+        self.cost_bps = cost_bps
+        self.periods_per_year = periods_per_year
+
+    def total_scores(self, technical_scores, fundamental_scores=None):
+        """按权重混合基本面 (每个 ticker 一个常数) 与每日技术评分"""
+        if fundamental_scores is None:
+            fundamental = pd.Series(NEUTRAL_FUNDAMENTAL_SCORE, index=technical_scores.columns)
+        else:
+            fundamental = pd.Series(fundamental_scores, dtype=float) \
+                .reindex(technical_scores.columns).fillna(NEUTRAL_FUNDAMENTAL_SCORE)
+
+        total = technical_scores.mul(self.technical_weight).add(fundamental * self.fundamental_weight, axis=1)
+        # 技术评分为 0 表示K线不足, 不产生信号
+        return total.where(technical_scores > 0)
+
+    def positions(self, total_scores):
+        """由每日总分生成仓位矩阵 (1 / 0 / -1)"""
+        short = -1.0 if self.allow_short else 0.0
+        signal = pd.DataFrame(
+            np.select(
+                [total_scores >= self.buy_threshold, total_scores < self.sell_threshold],
+                [1.0, short], np.nan
+            ),
+            index=total_scores.index, columns=total_scores.columns
+        )
+        if self.hold_neutral:
+            signal = signal.ffill()
+        return signal.fillna(0.0)
+
+    def run(self, close, fundamental_scores=None, technical_scores=None, ticker_metrics=True):
+        """回测宽表 close (日期 × ticker)
+
+        fundamental_scores: {ticker: 基本面评分} 或 Series, 可选
+        technical_scores: 预先计算的 technical_score_history(close), 可选 (参数优化时复用)
+        ticker_metrics: False 时不计算每个 ticker 的指标 ('metrics' 为 None), 只需组合指标时更快
+        返回 dict: positions, strategy_returns, equity, portfolio_returns, metrics (每个 ticker), portfolio (组合指标)
+        """
+        if technical_scores is None:
+            technical_scores = technical_score_history(close)
+
+        total = self.total_scores(technical_scores, fundamental_scores)
+        positions = self.positions(total)
+
+        returns = close.pct_change(fill_method=None).fillna(0.0)
+        turnover = positions.diff().abs().fillna(positions.abs())
+        strategy_returns = positions.shift(1).fillna(0.0) * returns - turnover * self.cost_bps / 10000
+
+        # 等权组合: 所有 ticker 的策略收益的平均
+        portfolio_returns = strategy_returns.mean(axis=1)
+        portfolio_positions = positions.abs().mean(axis=1)
+
+        return {
+            'total_scores': total,
+            'positions': positions,
+            'strategy_returns': strategy_returns,
+            'equity': (1 + strategy_returns).cumprod(),
+            'portfolio_returns': portfolio_returns,
+            'metrics': performance_metrics(strategy_returns, positions, self.periods_per_year)
+            if ticker_metrics else None,
+            'portfolio': performance_metrics(
+                portfolio_returns, portfolio_positions, self.periods_per_year
+            ).iloc[0].to_dict()
+        }
+
+    def run_panel(self, panel_store, tickers=None, start=None, end=None, **kwargs):
+        """直接在 PanelStore 的收盘价上回测 (不指定 tickers 时为内存映射视图, 不复制)"""
+        return self.run(panel_store.field('Close', tickers, start, end), **kwargs)
@@ -0,0 +1,166 @@
+"""
+命令行批量分析 (适合夜间预计算)
+
+    python batch.py                         # COMPANIES 中的5家公司
+    python batch.py AIR.PA TTE.PA MC.PA     # 指定 ticker
+    python batch.py --universe "CAC 40" --workers 8
+    python batch.py --universe "CAC 40" --panel-dir .cache/panel   # 同时更新价格面板
+    python batch.py --replay-dir fixtures/  # 回放 providers.record() 录制的数据, 不访问网络
+                                            # (缓存和结果写入该录制数据专用的目录, 见 providers.storage_dirs)
+
+先用一次批量下载预热行情/基本面缓存, 再在多个工作进程中并行计算,
+结果写入 ResultsStore (仪表盘直接读取相同数据时间戳的结果) 并追加到 ScoreHistory。
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from analyzer import StockAnalyzer
+from panel_store import PanelStore
+from providers import ReplayProvider, YFinanceProvider, storage_dirs
+from results_store import ResultsStore
+from history_db import ScoreHistory
+from instrumentation import trace
+from screener import available_universes, get_universe, load_universe
+from config import COMPANIES, REPLAY_DIR, SCORE_HISTORY_DB
+
+_worker_analyzer = None
+
+
+def _new_analyzer(results_dir, replay_dir=None, panel_store=None):
+    """replay_dir 指定时回放录制的数据, 并使用该录制数据专用的缓存目录"""
+    cache_dir, _ = storage_dirs(replay_dir)
+    return StockAnalyzer(
+        results_store=ResultsStore(results_dir),
+        score_history=ScoreHistory(os.path.join(results_dir, os.path.basename(SCORE_HISTORY_DB))),
+        panel_store=panel_store,
+        provider=ReplayProvider(replay_dir) if replay_dir else YFinanceProvider(),
+        cache_dir=cache_dir
+    )
+
+
+def _init_worker(results_dir, replay_dir=None):
+    global _worker_analyzer
+    _worker_analyzer = _new_analyzer(results_dir, replay_dir)
+
+
+def _analyze(ticker, force_refresh):
+    """在工作进程中分析一个 ticker, 返回可序列化的摘要 (stages: 各阶段耗时, 毫秒)"""
+    start = time.perf_counter()
+    with trace("batch", ticker=ticker) as current:
+        try:
+            result = _worker_analyzer.analyze_ticker(ticker, force_refresh=force_refresh)
+        except Exception as e:
+            result = {'error': str(e)}
+    elapsed = time.perf_counter() - start
+
+    if 'error' in result:
+        return {'ticker': ticker, 'success': False, 'seconds': elapsed, 'error': result['error'],
+                'stages': current.totals()}
+    return {
+        'ticker': ticker,
+        'success': True,
+        'seconds': elapsed,
+        'stages': current.totals(),
+        'total_score': result['total_score'],
+        'recommendation': result['recommendation']
+    }
+
+
+def stage_totals(summaries):
+    """各阶段在所有 ticker 上的总耗时 (毫秒), 按耗时从大到小排列"""
+    totals = {}
+    for summary in summaries:
+        for name, ms in summary.get('stages', {}).items():
+            totals[name] = totals.get(name, 0.0) + ms
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def resolve_tickers(args):
+    """命令行参数中的 ticker / 公司名 / 股票池"""
+    if args.universe_file:
+        return list(load_universe(args.universe_file))
+    if args.universe:
+        return list(get_universe(args.universe))
+    if args.tickers:
+        return [COMPANIES[name]['ticker'] if name in COMPANIES else name for name in args.tickers]
+    return [company['ticker'] for company in COMPANIES.values()]
+
+
+def run_batch(tickers, workers=None, results_dir=None, force_refresh=False, log=print,
+              panel_dir=None, replay_dir=None):
+    """预热缓存后并行分析全部 ticker, 返回 (摘要列表, 总耗时)
+
+    results_dir: 默认为 RESULTS_DIR, 回放时为该录制数据专用的结果目录 (见 providers.storage_dirs)
+    panel_dir: 指定时把下载的行情追加到该目录的 PanelStore
+    replay_dir: 指定时从该目录回放录制的数据 (ReplayProvider), 而不是从 Yahoo Finance 下载
+    """
+    start = time.perf_counter()
+    results_dir = results_dir or storage_dirs(replay_dir)[1]
+
+    warm_start = time.perf_counter()
+    panel_store = PanelStore(panel_dir) if panel_dir else None
+    universe = _new_analyzer(results_dir, replay_dir, panel_store).fetch_universe(
+        tickers, force_refresh=force_refresh
+    )
+    log(f"Préchargement des données: {len(tickers)} tickers en {time.perf_counter() - warm_start:.2f}s")
+    for ticker, error in universe['errors'].items():
+        log(f"  ⚠️ {ticker}: {error}")
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(results_dir, replay_dir)) as executor:
+        # 缓存已在上面刷新, 工作进程无需再次强制下载
+        futures = [executor.submit(_analyze, ticker, False) for ticker in tickers]
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries.append(summary)
+            if summary['success']:
+                log(f"  {summary['ticker']:<10} {summary['seconds']:6.2f}s  "
+                    f"{summary['total_score']:.2f}  {summary['recommendation']}")
+            else:
+                log(f"  {summary['ticker']:<10} {summary['seconds']:6.2f}s  ❌ {summary['error']}")
+
+    if summaries:
+        log("Temps par étape (total / moyenne par ticker):")
+        for name, ms in stage_totals(summaries).items():
+            log(f"  {name:<32} {ms:10.1f} ms  {ms / len(summaries):8.1f} ms")
+
+    return summaries, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse boursière en lot (précalcul des résultats)")
+    parser.add_argument("tickers", nargs="*", help="Tickers ou noms d'entreprises (défaut: COMPANIES)")
+    parser.add_argument("--universe", choices=available_universes(), help="Univers d'actions prédéfini")
+    parser.add_argument("--universe-file", help="Fichier CSV ticker,name")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Nombre de processus")
+    parser.add_argument(
+        "--results-dir", help="Répertoire des résultats (défaut: RESULTS_DIR, ou celui du rejeu avec --replay-dir)"
+    )
+    parser.add_argument("--force-refresh", action="store_true", help="Ignorer les caches et retélécharger")
+    parser.add_argument("--panel-dir", help="Mettre à jour le panel de prix mémoire-mappé de ce répertoire")
+    parser.add_argument(
+        "--replay-dir", default=REPLAY_DIR,
+        help="Rejouer les données enregistrées de ce répertoire (hors ligne, défaut: STOCK_ANALYZER_REPLAY_DIR)"
+    )
+    args = parser.parse_args(argv)
+
+    tickers = resolve_tickers(args)
+    results_dir = args.results_dir or storage_dirs(args.replay_dir)[1]
+    summaries, elapsed = run_batch(
+        tickers, workers=args.workers, results_dir=results_dir, force_refresh=args.force_refresh,
+        panel_dir=args.panel_dir, replay_dir=args.replay_dir
+    )
+
+    succeeded = sum(summary['success'] for summary in summaries)
+    print(f"Terminé: {succeeded}/{len(tickers)} tickers en {elapsed:.2f}s "
+          f"({args.workers} processus) -> {results_dir}")
+    return 0 if succeeded == len(tickers) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
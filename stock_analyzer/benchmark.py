@@ -0,0 +1,319 @@
+"""
+性能基准测试
+
+在确定性的合成 OHLCV 数据 (126 根到 1M 根K线, 1 到 1000 个 ticker) 上测量热点函数的耗时和峰值内存,
+结果保存为 JSON, 每次优化前后各运行一次即可比较:
+
+    python benchmark.py                                  # quick 规模, 结果写入 BENCHMARK_DIR
+    python benchmark.py --preset full --output after.json
+    python benchmark.py --only technical chart --repeat 10
+    python benchmark.py --compare before.json            # 运行并与之前的结果对比
+    python benchmark.py --compare before.json after.json # 只对比两个已有的结果
+
+耗时为多次运行的最小值/中位数 (第一次调用作为预热不计入); 峰值内存在另一次运行中用 tracemalloc 测量,
+不影响计时。run_analysis 使用合成数据的 provider, 不访问网络。
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+from statistics import median
+
+import numpy as np
+import pandas as pd
+
+from providers import ReplayProvider
+from config import BENCHMARK_DIR
+
+# 合成数据的最后一根K线 (固定日期, 结果与运行日期无关)
+SYNTHETIC_END = "2026-10-16"
+
+# 超过该K线数时使用分钟K线 (工作日K线的日期会超出 pandas 的时间范围)
+DAILY_BARS_LIMIT = 20_000
+
+PRESETS = {
+    'quick': {'bars': [126, 1_000, 10_000], 'tickers': [1, 10, 100]},
+    'full': {'bars': [126, 1_000, 10_000, 100_000, 1_000_000], 'tickers': [1, 10, 100, 1_000]}
+}
+
+# 每个用例的计时预算 (秒): 单次运行较慢时减少重复次数
+TIME_BUDGET_SECONDS = 10.0
+
+
+# ---- 合成数据 ----
+
+def synthetic_ohlcv(bars, seed=0, end=SYNTHETIC_END):
+    """bars 根K线的几何随机游走 OHLCV (与 yfinance history 的列相同)"""
+    rng = np.random.default_rng(seed)
+    daily = bars <= DAILY_BARS_LIMIT
+    index = pd.date_range(end=end, periods=bars, freq="B" if daily else "min", tz="Europe/Paris", name="Date")
+
+    # 分钟K线不加漂移、波动率按一个交易日约 500 根K线缩小, 1M 根K线的价格也保持在合理范围
+    drift, volatility = (0.0003, 0.015) if daily else (0.0, 0.015 / np.sqrt(500))
+    close = 100 * np.exp(np.cumsum(rng.normal(drift, volatility, bars)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + rng.normal(0, 0.003, bars))
+    spread = np.abs(rng.normal(0, 0.006, bars))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.integers(100_000, 5_000_000, bars).astype(float),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0
+    }, index=index)
+
+
+def synthetic_close_panel(bars, tickers, seed=0):
+    """bars × tickers 的收盘价宽表"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=SYNTHETIC_END, periods=bars, tz="Europe/Paris")
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, (bars, tickers)), axis=0))
+    return pd.DataFrame(close, index=index, columns=[f"T{i:04d}" for i in range(tickers)])
+
+
+def synthetic_info(seed=0):
+    """与 yf.Ticker.info 相同键名的基本面数据, 各项取值覆盖所有评分区间"""
+    rng = np.random.default_rng(seed)
+    revenue = float(rng.uniform(1e9, 1e11))
+    return {
+        'longName': f"Synthetic {seed}",
+        'sector': "Synthetic",
+        'trailingPE': float(rng.uniform(5, 40)),
+        'dividendYield': float(rng.uniform(0, 6)),
+        'dividendRate': float(rng.uniform(0, 5)),
+        'returnOnEquity': float(rng.uniform(-0.05, 0.3)),
+        'revenueGrowth': float(rng.uniform(-0.1, 0.25)),
+        'totalRevenue': revenue,
+        'debtToEquity': float(rng.uniform(0, 200)),
+        'totalDebt': float(revenue * rng.uniform(0, 1.5))
+    }
+
+
+class SyntheticProvider(ReplayProvider):
+    """每个 ticker 生成固定的合成数据 (种子由 ticker 决定), 按 ReplayProvider 的规则切片"""
+
+    def __init__(self, bars=504):
+        super().__init__(directory=None)
+        self.bars = bars
+
+    @staticmethod
+    def _seed(ticker):
+        return zlib.crc32(ticker.encode("utf-8"))
+
+    def _bars(self, ticker, interval):
+        key = (ticker, interval)
+        with self._lock:
+            if key not in self._frames:
+                self._frames[key] = synthetic_ohlcv(self.bars, seed=self._seed(ticker))
+            return self._frames[key]
+
+    def info(self, ticker):
+        return synthetic_info(self._seed(ticker))
+
+
+# ---- 用例 ----
+
+def _analyzer(provider=None, cache_dir=None):
+    """使用独立缓存目录的分析器 (不读写真实的缓存和结果)"""
+    from analyzer import StockAnalyzer
+
+    return StockAnalyzer(
+        provider=provider or SyntheticProvider(),
+        cache_dir=cache_dir or tempfile.mkdtemp(prefix="benchmark-")
+    )
+
+
+def build_cases(preset, workdir):
+    """返回 [(名称, 参数, 被测函数)], 数据在这里准备好, 不计入耗时"""
+    from indicators import latest_technical_results
+    from visualization import Visualizer
+
+    sizes = PRESETS[preset]
+    provider = SyntheticProvider()
+    analyzer = _analyzer(provider, cache_dir=os.path.join(workdir, "shared"))
+    visualizer = Visualizer()
+    cases = []
+
+    for bars in sizes['bars']:
+        hist = synthetic_ohlcv(bars)
+        cases.append(('technical_indicators', {'bars': bars},
+                      lambda hist=hist: analyzer.calculate_technical_indicators(hist)))
+        cases.append(('price_chart', {'bars': bars},
+                      lambda hist=hist: visualizer.create_price_chart(hist, "Synthetic", "#1F77B4")))
+
+    for tickers in sizes['tickers']:
+        close = synthetic_close_panel(252, tickers)
+        cases.append(('technical_indicators_universe', {'bars': 252, 'tickers': tickers},
+                      lambda close=close: latest_technical_results(close, params=analyzer.technical_params)))
+
+        infos = [synthetic_info(seed) for seed in range(tickers)]
+        cases.append(('fundamental_analysis', {'tickers': tickers},
+                      lambda infos=infos: [analyzer.calculate_fundamental_analysis(info) for info in infos]))
+
+        scores = np.random.default_rng(0).uniform(0, 5, (tickers, 2)).tolist()
+        cases.append(('recommendation', {'tickers': tickers},
+                      lambda scores=scores: [analyzer.get_recommendation(f, t) for f, t in scores]))
+
+    # run_analysis: cold 为空缓存 (下载 + 写缓存 + 计算), warm 为缓存命中但重新计算结果
+    counter = iter(range(10 ** 9))
+    cases.append(('run_analysis', {'cache': 'cold'}, lambda: _analyzer(
+        provider, cache_dir=os.path.join(workdir, f"cold-{next(counter)}")
+    ).run_analysis("Airbus")))
+
+    analyzer.run_analysis("Airbus")
+
+    def warm():
+        analyzer.result_cache.clear()
+        return analyzer.run_analysis("Airbus")
+    cases.append(('run_analysis', {'cache': 'warm'}, warm))
+
+    cases.append(('score_gauge', {}, lambda: visualizer.create_score_gauge(3.4, "Score Total", "#1F77B4")))
+    return cases
+
+
+# ---- 测量 ----
+
+def measure(fn, repeat, budget=TIME_BUDGET_SECONDS):
+    """返回 dict: runs, min_s, median_s, mean_s, peak_memory_bytes"""
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    runs = max(1, min(repeat, int(budget / max(first, 1e-9))))
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': runs,
+        'min_s': min(timings),
+        'median_s': median(timings),
+        'mean_s': sum(timings) / len(timings),
+        'peak_memory_bytes': peak
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment():
+    import plotly
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'commit': _git_commit()
+    }
+
+
+def _format_params(params):
+    return ", ".join(f"{name}={value}" for name, value in params.items())
+
+
+def run_benchmarks(preset='quick', repeat=5, only=None, log=print):
+    """运行全部 (或名称包含 only 中任一字符串的) 用例, 返回可写入 JSON 的 dict"""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+        for name, params, fn in build_cases(preset, workdir):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            result = {'name': name, 'params': params, **measure(fn, repeat)}
+            results.append(result)
+            log(f"  {name:<30} {_format_params(params):<22} {result['median_s'] * 1e3:11.3f} ms  "
+                f"{result['peak_memory_bytes'] / 1e6:9.2f} Mo  ({result['runs']} essais)")
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'preset': preset,
+        'repeat': repeat,
+        'environment': environment(),
+        'results': results
+    }
+
+
+def compare(before, after, log=print):
+    """按 (名称, 参数) 对比两次结果的中位耗时和峰值内存, 返回对比行列表"""
+    key = lambda result: (result['name'], json.dumps(result['params'], sort_keys=True))
+    previous = {key(result): result for result in before['results']}
+
+    rows = []
+    log(f"  {'':<30} {'':<22} {'avant':>11} {'après':>11} {'ratio':>7} {'mémoire':>8}")
+    for result in after['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        time_ratio = result['median_s'] / old['median_s'] if old['median_s'] else float('nan')
+        memory_ratio = result['peak_memory_bytes'] / old['peak_memory_bytes'] \
+            if old['peak_memory_bytes'] else float('nan')
+        rows.append({'name': result['name'], 'params': result['params'],
+                     'time_ratio': time_ratio, 'memory_ratio': memory_ratio})
+        log(f"  {result['name']:<30} {_format_params(result['params']):<22} "
+            f"{old['median_s'] * 1e3:9.3f}ms {result['median_s'] * 1e3:9.3f}ms "
+            f"{time_ratio:6.2f}x {memory_ratio:7.2f}x")
+    return rows
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks des fonctions critiques (données synthétiques)")
+    parser.add_argument("--preset", choices=list(PRESETS), default="quick", help="Tailles des données")
+    parser.add_argument("--repeat", type=int, default=5, help="Nombre maximal d'essais par cas")
+    parser.add_argument("--only", nargs="+", help="Ne lancer que les cas dont le nom contient ces textes")
+    parser.add_argument("--output", help="Fichier JSON des résultats (défaut: BENCHMARK_DIR/<date>.json)")
+    parser.add_argument(
+        "--compare", nargs="+", metavar="JSON",
+        help="Résultats de référence; avec deux fichiers, compare sans relancer les benchmarks"
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.compare) == 2:
+        compare(_load(args.compare[0]), _load(args.compare[1]))
+        return 0
+
+    report = run_benchmarks(args.preset, args.repeat, args.only)
+    output = args.output or os.path.join(BENCHMARK_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Résultats -> {output}")
+
+    if args.compare:
+        compare(_load(args.compare[0]), report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
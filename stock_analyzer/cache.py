@@ -0,0 +1,430 @@
+"""
+本地数据缓存
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import (
+    CACHE_DIR, HISTORY_INTERVAL, HISTORY_PERIOD, HISTORY_REFRESH_SECONDS,
+    FUNDAMENTALS_TTL_SECONDS, FUNDAMENTALS_STALE_SECONDS, RESULT_CACHE_MAX_ENTRIES, RESUMABLE_INTERVALS
+)
+
+
+def period_to_offset(period):
+    """将 yfinance 的周期字符串 (5d, 6mo, 1y, max...) 转换为 DateOffset"""
+    if period == "max":
+        return None
+    units = [("mo", "months"), ("wk", "weeks"), ("y", "years"), ("d", "days")]
+    for suffix, name in units:
+        if period.endswith(suffix):
+            return pd.DateOffset(**{name: int(period[:-len(suffix)])})
+    raise ValueError(f"Période non supportée: {period}")
+
+
+class HistoryCache:
+    """按 (ticker, interval) 保存在本地 Parquet 文件中的 OHLCV 行情
+
+    已收盘交易日的K线不会再变化, 所以只需向数据源请求最后一个已保存交易日之后的数据。
+    读取过的文件同时保存在内存中, 文件未被修改时直接复用, 同一进程内的所有会话共享。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, refresh_seconds=HISTORY_REFRESH_SECONDS):
+        self.cache_dir = os.path.join(cache_dir, "history")
+        self.refresh_seconds = refresh_seconds
+        self._frames = {}
+        self._backfilled = set()
+        self._lock = threading.Lock()
+
+    def _path(self, ticker, interval):
+        safe_ticker = ticker.replace("/", "_").replace("^", "_")
+        return os.path.join(self.cache_dir, f"{safe_ticker}_{interval}.parquet")
+
+    def load(self, ticker, interval=HISTORY_INTERVAL):
+        """读取已缓存的全部K线, 没有缓存时返回 None"""
+        path = self._path(ticker, interval)
+        if not os.path.exists(path):
+            return None
+
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._frames.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        try:
+            data = pd.read_parquet(path)
+        except Exception as e:
+            print(f"Cache illisible {path}: {e}")
+            return None
+
+        with self._lock:
+            self._frames[path] = (mtime, data)
+        return data
+
+    def save(self, ticker, interval, data):
+        """原子地写入缓存文件"""
+        path = self._path(ticker, interval)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        data.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._frames[path] = (os.path.getmtime(path), data)
+
+    def touch(self, ticker, interval=HISTORY_INTERVAL):
+        """记录一次没有新K线的同步"""
+        path = self._path(ticker, interval)
+        os.utime(path)
+        with self._lock:
+            entry = self._frames.get(path)
+            if entry is not None:
+                self._frames[path] = (os.path.getmtime(path), entry[1])
+
+    def is_fresh(self, ticker, interval=HISTORY_INTERVAL):
+        """最近一次与数据源同步是否在 refresh_seconds 之内"""
+        path = self._path(ticker, interval)
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.refresh_seconds
+
+    def get_history(self, ticker, fetch, interval=HISTORY_INTERVAL, period=HISTORY_PERIOD, force=False,
+                    min_bars=0):
+        """返回最近 period 的K线 (且至少 min_bars 根), 只下载缓存中缺失的K线
+
+        fetch(period=...)、fetch(start=...) 或 fetch(start=..., end=...) 负责实际的下载并返回 DataFrame。
+        force=True 时忽略 refresh_seconds, 总是向数据源检查新K线。
+        min_bars 为指标预热需要的K线数; 缓存中的K线不够时, 只向前补充下载缺少的部分。
+        """
+        data = self._sync(ticker, fetch, interval, period, force)
+        if min_bars and len(data) < min_bars:
+            data = self.backfill(ticker, data, min_bars, fetch, interval)
+        return self._window(data, period, min_bars)
+
+    def _sync(self, ticker, fetch, interval, period, force):
+        """下载最后一个已保存交易日之后的新K线, 返回缓存中的全部K线"""
+        cached = self.load(ticker, interval)
+        has_cache = cached is not None and not cached.empty
+
+        if has_cache and not force and self.is_fresh(ticker, interval):
+            return cached
+
+        # 日线总是从最后一个已保存的交易日续传, 即使缓存早于 period 窗口 (否则旧缓存与新窗口之间会留下空缺);
+        # 日内周期的数据源无法从早于窗口的日期续传, 这时丢弃旧缓存, 重新下载整个窗口
+        stale = has_cache and interval not in RESUMABLE_INTERVALS and self._is_outside_window(cached, period)
+        try:
+            if has_cache and not stale:
+                new_data = fetch(start=self.resume_date(cached))
+            else:
+                new_data = fetch(period=period)
+        except Exception:
+            if has_cache:
+                return cached
+            raise
+
+        if stale:
+            return self.replace(ticker, new_data, interval, fallback=cached)
+        return self.update(ticker, new_data, interval, cached=cached)
+
+    def backfill_range(self, data, min_bars):
+        """向前补充 min_bars - len(data) 根K线的下载区间 (start, end), end 不包含在内
+
+        按已有K线的平均时间间隔估算 (包含夜间和周末), 多留两成余量。
+        """
+        first = data.index[0]
+        step = (data.index[-1] - first) / max(len(data) - 1, 1)
+        start = first - step * (min_bars - len(data)) * 1.2 - pd.Timedelta(days=7)
+        return start.strftime("%Y-%m-%d"), first.strftime("%Y-%m-%d")
+
+    def needs_backfill(self, ticker, data, min_bars, interval=HISTORY_INTERVAL):
+        """data 不足 min_bars 根, 且本进程还没有为该 ticker 补充下载过"""
+        return not data.empty and len(data) < min_bars and (ticker, interval) not in self._backfilled
+
+    def backfill(self, ticker, data, min_bars, fetch, interval=HISTORY_INTERVAL):
+        """向前补充下载更早的K线, 直到缓存中至少有 min_bars 根
+
+        每个进程对每个 (ticker, interval) 只尝试一次: 上市不久的公司或只提供最近数据的日内周期
+        本来就没有更早的K线, 不会在每次分析时重复请求。
+        """
+        with self._lock:
+            if not self.needs_backfill(ticker, data, min_bars, interval):
+                return data
+            self._backfilled.add((ticker, interval))
+
+        start, end = self.backfill_range(data, min_bars)
+        try:
+            older = fetch(start=start, end=end)
+        except Exception as e:
+            print(f"Erreur historique antérieur {ticker}: {e}")
+            return data
+        return self.prepend(ticker, older, interval, cached=data)
+
+    def prepend(self, ticker, older, interval=HISTORY_INTERVAL, cached=None):
+        """把更早的K线加到缓存前面并保存, 返回合并后的全部K线"""
+        if cached is None:
+            cached = self.load(ticker, interval)
+        if older is None or older.empty or cached is None or cached.empty:
+            return cached
+
+        older = self._align_tz(cached, older)
+        older = older[older.index < cached.index[0]]
+        if older.empty:
+            return cached
+        data = pd.concat([older, cached])
+        self.save(ticker, interval, data)
+        return data
+
+    def replace(self, ticker, new_data, interval=HISTORY_INTERVAL, fallback=None):
+        """用新下载的K线替换整个缓存 (不与旧K线合并); 没有新K线时返回 fallback"""
+        if new_data is None or new_data.empty:
+            return fallback if fallback is not None else pd.DataFrame()
+        self.save(ticker, interval, new_data)
+        with self._lock:
+            # 新的缓存可能需要重新向前补充预热K线
+            self._backfilled.discard((ticker, interval))
+        return new_data
+
+    def update(self, ticker, new_data, interval=HISTORY_INTERVAL, cached=None):
+        """把新下载的K线合并进缓存并保存, 返回合并后的全部K线"""
+        if cached is None:
+            cached = self.load(ticker, interval)
+        has_cache = cached is not None and not cached.empty
+
+        if new_data is None or new_data.empty:
+            if has_cache:
+                self.touch(ticker, interval)
+                return cached
+            return pd.DataFrame()
+
+        data = self._merge(cached, new_data) if has_cache else new_data
+        self.save(ticker, interval, data)
+        return data
+
+    @staticmethod
+    def resume_date(cached):
+        """增量下载的起始日期: 从最后一个已保存的交易日重新下载, 覆盖盘中未收盘的K线"""
+        return cached.index[-1].strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _is_outside_window(cached, period):
+        """最后一根已缓存的K线是否早于从现在起往前 period 的窗口"""
+        offset = period_to_offset(period)
+        if offset is None:
+            return False
+        return cached.index[-1] < pd.Timestamp.now(tz=getattr(cached.index, "tz", None)) - offset
+
+    @staticmethod
+    def _align_tz(cached, new_data):
+        """把新下载的K线转换为缓存的时区"""
+        cached_tz = getattr(cached.index, "tz", None)
+        new_tz = getattr(new_data.index, "tz", None)
+        if cached_tz is not None and new_tz is None:
+            return new_data.tz_localize(cached_tz)
+        if cached_tz is not None and str(new_tz) != str(cached_tz):
+            return new_data.tz_convert(cached_tz)
+        return new_data
+
+    @classmethod
+    def _merge(cls, cached, new_data):
+        """合并缓存与新下载的K线, 重叠部分以新数据为准"""
+        new_data = cls._align_tz(cached, new_data)
+        older = cached[cached.index < new_data.index[0]]
+        return pd.concat([older, new_data]).sort_index()
+
+    def window(self, data, period=HISTORY_PERIOD, min_bars=0):
+        """截取最近 period 的K线, 不足 min_bars 根时取最后 min_bars 根"""
+        return self._window(data, period, min_bars)
+
+    @staticmethod
+    def _window(data, period, min_bars=0):
+        offset = period_to_offset(period)
+        if offset is None or data.empty:
+            return data
+        windowed = data[data.index >= data.index[-1] - offset]
+        return data.iloc[-min_bars:] if len(windowed) < min_bars else windowed
+
+
+class FundamentalsCache:
+    """stock.info 基本面数据缓存
+
+    - 未超过 ttl: 直接返回缓存
+    - 超过 ttl 但未超过 ttl + stale_seconds: 立即返回旧数据, 同时在后台线程刷新
+    - 更旧或没有缓存: 同步下载
+    与 HistoryCache 一样, 内存中的副本只在文件未被修改时使用 (batch.py 等其它进程会重写缓存文件)。
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=FUNDAMENTALS_TTL_SECONDS,
+                 stale_seconds=FUNDAMENTALS_STALE_SECONDS):
+        self.cache_dir = os.path.join(cache_dir, "fundamentals")
+        self.ttl = ttl
+        self.stale_seconds = stale_seconds
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _path(self, ticker):
+        safe_ticker = ticker.replace("/", "_").replace("^", "_")
+        return os.path.join(self.cache_dir, f"{safe_ticker}.json")
+
+    def _load(self, ticker):
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            with self._lock:
+                cached = self._entries.get(ticker)
+            return None if cached is None else cached[1]
+
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._entries.get(ticker)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except Exception as e:
+            print(f"Cache illisible {path}: {e}")
+            return None
+
+        with self._lock:
+            self._entries[ticker] = (mtime, entry)
+        return entry
+
+    def _store(self, ticker, info):
+        entry = {'fetched_at': time.time(), 'info': info}
+
+        path = self._path(ticker)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._entries[ticker] = (os.path.getmtime(path), entry)
+        return entry
+
+    def _refresh_in_background(self, ticker, fetch):
+        with self._lock:
+            if ticker in self._refreshing:
+                return
+            self._refreshing.add(ticker)
+
+        def refresh():
+            try:
+                self._store(ticker, fetch())
+            except Exception as e:
+                print(f"Erreur rafraîchissement fondamentaux {ticker}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(ticker)
+
+        threading.Thread(target=refresh, name=f"info-refresh-{ticker}", daemon=True).start()
+
+    def fetched_at(self, ticker):
+        """缓存数据的下载时间 (Unix 时间戳), 没有缓存时返回 None"""
+        entry = self._load(ticker)
+        return None if entry is None else entry['fetched_at']
+
+    def age(self, ticker):
+        """缓存数据的年龄(秒), 没有缓存时返回 None"""
+        fetched_at = self.fetched_at(ticker)
+        return None if fetched_at is None else time.time() - fetched_at
+
+    def get_info(self, ticker, fetch, force=False):
+        """返回 ticker 的 info 字典, fetch() 负责实际下载
+
+        force=True 时同步重新下载。
+        """
+        entry = self._load(ticker)
+        if entry is not None and not force:
+            age = time.time() - entry['fetched_at']
+            if age < self.ttl:
+                return entry['info']
+            if age < self.ttl + self.stale_seconds:
+                self._refresh_in_background(ticker, fetch)
+                return entry['info']
+
+        try:
+            return self._store(ticker, fetch())['info']
+        except Exception:
+            if entry is not None:
+                return entry['info']
+            raise
+
+
+class SingleFlight:
+    """合并并发的相同请求: 同一个 key 同时只执行一次 fn, 其余调用者等待并共享其结果"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not is_leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+def content_hash(*parts):
+    """按内容计算的哈希, 用作缓存键; DataFrame / Series 按全部值和索引计算"""
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            labels = part.columns if isinstance(part, pd.DataFrame) else part.name
+            digest.update(repr(labels).encode())
+            digest.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """进程内的 LRU 缓存, 如分析结果 (键为公司和数据时间戳) 或图表对象 (键为内容哈希)"""
+
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
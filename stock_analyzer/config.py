@@ -2,6 +2,8 @@
 配置文件和常量定义
 """
 
+import os
+
 # 公司配置
 COMPANIES = {
     "TOTAL Energie": {
@@ -257,4 +259,125 @@ FUNDAMENTAL_EXPLANATIONS = {
         },
         "investment_insight": "Évaluer la capacité de remboursement et le coût de la dette"
     }
-}
\ No newline at end of file
+}
+
+# 本地数据缓存
+CACHE_DIR = os.environ.get(
+    "STOCK_ANALYZER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+
+# 设置时使用该目录中录制的行情和基本面数据 (providers.ReplayProvider), 不访问 Yahoo Finance
+REPLAY_DIR = os.environ.get("STOCK_ANALYZER_REPLAY_DIR")
+# 回放模式的缓存和结果保存在这里 (每份录制数据一个子目录), 不与真实数据的缓存、结果和评分历史混在一起
+REPLAY_WORK_DIR = os.path.join(CACHE_DIR, "replay")
+
+# 历史行情: 默认周期/间隔, 以及两次增量更新之间的最短间隔(秒)
+HISTORY_PERIOD = "6mo"
+HISTORY_INTERVAL = "1d"
+HISTORY_REFRESH_SECONDS = 15 * 60
+
+# K线周期: 界面上可选的周期 -> 下载并缓存的最细周期 (source) 及其下载时长 (period),
+# 需要从 source 聚合时的 pandas 频率 (rule), 以及显示名称。
+# Yahoo 只提供最近 7 天的 1m K线和最近 60 天的 5m K线, 所以 15m / 1h 由同一份 5m 缓存聚合得到
+TIMEFRAMES = {
+    "1d": {'source': "1d", 'period': HISTORY_PERIOD, 'rule': None, 'name': "Journalier", 'span': "6 mois"},
+    "1h": {'source': "5m", 'period': "60d", 'rule': "1h", 'name': "1 heure", 'span': "60 jours"},
+    "15m": {'source': "5m", 'period': "60d", 'rule': "15min", 'name': "15 minutes", 'span': "60 jours"},
+    "5m": {'source': "5m", 'period': "60d", 'rule': None, 'name': "5 minutes", 'span': "60 jours"},
+    "1m": {'source': "1m", 'period': "7d", 'rule': None, 'name': "1 minute", 'span': "7 jours"}
+}
+
+# 数据源可以从任意日期续传的周期 (日线及更长); 日内周期只提供最近一段时间的K线, 无法从旧缓存处续传
+RESUMABLE_INTERVALS = ("1d", "1wk", "1mo")
+
+# 基本面数据 (stock.info): 有效期, 以及过期后仍可先返回旧数据并在后台刷新的时长(秒)
+FUNDAMENTALS_TTL_SECONDS = 24 * 3600
+FUNDAMENTALS_STALE_SECONDS = 7 * 24 * 3600
+
+# 分析结果缓存 (按公司和数据时间戳) 的最大条目数
+RESULT_CACHE_MAX_ENTRIES = 256
+
+# Plotly 图表对象缓存 (按内容哈希, 所有会话共享) 的最大条目数
+FIGURE_CACHE_MAX_ENTRIES = 128
+
+# 价格曲线: 图表宽度(像素), 超过该点数时降采样 ('lttb' 或 'minmax'),
+# 绘制的点数超过 CHART_WEBGL_THRESHOLD 时使用 WebGL (Scattergl) 曲线
+CHART_WIDTH_PX = 1200
+CHART_DOWNSAMPLING = "lttb"
+CHART_WEBGL_THRESHOLD = 1000
+
+# 批量下载: 并发获取 stock.info 的最大线程数
+BATCH_INFO_WORKERS = 8
+
+# 数据源调用在独立的线程池中执行, 超过各方法的时限 (秒) 即放弃等待 (有缓存时回退到缓存的数据)
+PROVIDER_WORKERS = 16
+PROVIDER_TIMEOUTS = {
+    "info": 15,
+    "history": 20,
+    "download": 60
+}
+
+# 筛选器: 可选的股票池文件 (CSV, 列为 ticker,name), 路径相对于 UNIVERSE_DIR
+UNIVERSE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "universes")
+UNIVERSES = {
+    "CAC 40": "cac40.csv"
+}
+
+# 不在 COMPANIES 中的 ticker 的图表颜色
+DEFAULT_COLOR = "#1F77B4"
+
+# 预计算分析结果的存储目录 (batch.py 写入, 仪表盘读取)
+RESULTS_DIR = os.environ.get(
+    "STOCK_ANALYZER_RESULTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+)
+
+# 回测: 推荐阈值 (与 get_recommendation 一致: >= 3.5 为 ACHAT, < 2.5 为 VENTE)
+BACKTEST_BUY_THRESHOLD = 3.5
+BACKTEST_SELL_THRESHOLD = 2.5
+TRADING_DAYS_PER_YEAR = 252
+
+# 技术指标参数 (calculate_technical_indicators 的默认值, 可由参数优化器调整)
+TECHNICAL_PARAMS = {
+    "rsi_window": 14,
+    "ma_short": 20,
+    "ma_medium": 50,
+    "ma_long": 200,
+    "macd_fast": 12,
+    "macd_slow": 26,
+    "macd_signal": 9,
+    "bb_window": 20,
+    "bb_k": 2,
+    "momentum_lookback": 22
+}
+
+# 总分权重: 基本面60%, 技术面40%
+SCORE_WEIGHTS = {
+    "fundamental": 0.6,
+    "technical": 0.4
+}
+
+# 滚动前推验证: 训练窗口与测试窗口的长度 (K线数)
+WALKFORWARD_TRAIN_BARS = 2 * 252
+WALKFORWARD_TEST_BARS = 126
+
+# 内存映射的价格面板 (日期 × ticker × OHLCV), 供大股票池的筛选和回测使用
+PANEL_DIR = os.path.join(CACHE_DIR, "panel")
+
+# 分析结果的历史数据库 (每次分析追加一条记录)
+SCORE_HISTORY_DB = os.path.join(RESULTS_DIR, "history.sqlite")
+
+# 基准测试 (benchmark.py) 结果的默认保存目录
+BENCHMARK_DIR = os.path.join(RESULTS_DIR, "benchmarks")
+
+# 设置时每次请求结束输出一行分阶段计时的 JSON 日志 (instrumentation 模块) 到标准错误
+TIMING_LOG = os.environ.get("STOCK_ANALYZER_TIMING_LOG", "") not in ("", "0")
+
+# 运行指标 (metrics 模块) 的导出: 本地 HTTP 端点的端口 (0 表示不启动) 和 / 或定期写入的文本文件
+METRICS_ADDR = os.environ.get("STOCK_ANALYZER_METRICS_ADDR", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("STOCK_ANALYZER_METRICS_PORT", "0"))
+METRICS_TEXTFILE = os.environ.get("STOCK_ANALYZER_METRICS_TEXTFILE", "")
+METRICS_TEXTFILE_INTERVAL = 15
+# 最后一次渲染在该时长 (秒) 内的会话计为活动会话
+METRICS_SESSION_WINDOW = 300
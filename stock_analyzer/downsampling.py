@@ -0,0 +1,71 @@
+"""
+长价格序列的降采样 (只用于绘图)
+
+图表宽度只有约 CHART_WIDTH_PX 个像素, 多出的点不会显示, 只会增加传给浏览器的数据量。
+- LTTB (Largest-Triangle-Three-Buckets): 每个桶保留与相邻点构成最大三角形面积的点, 保留曲线形状
+- min/max: 每个桶保留最小值和最大值, 保证价格的极值都能显示
+两者都返回被保留点的位置, 同一组位置可用于对齐的其它序列 (如移动平均线)。
+"""
+
+import numpy as np
+
+
+def lttb_indices(x, y, n_out):
+    """LTTB 降采样到 n_out 个点, 返回位置数组 (总是包含第一个和最后一个点)"""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # 首尾各自为一个桶, 中间 n_out - 2 个桶的边界
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(area))
+        indices[i + 1] = selected
+    return indices
+
+
+def minmax_indices(y, n_out):
+    """每个桶保留最小值和最大值, 共约 n_out 个点, 返回排序后的位置数组"""
+    n = len(y)
+    buckets = n_out // 2
+    if n <= n_out or buckets < 1:
+        return np.arange(n)
+
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    indices = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        bucket = y[start:end]
+        indices.append(start + int(np.argmin(bucket)))
+        indices.append(start + int(np.argmax(bucket)))
+    return np.unique(indices)
+
+
+def downsample_indices(index, values, max_points, method="lttb"):
+    """按 method ('lttb' 或 'minmax') 选出最多约 max_points 个点的位置
+
+    index 为日期索引 (DatetimeIndex) 或数值数组, values 为对应的价格。
+    """
+    if len(values) <= max_points:
+        return np.arange(len(values))
+    if method == "minmax":
+        return minmax_indices(values, max_points)
+    if method == "lttb":
+        x = index.asi8 if hasattr(index, 'asi8') else np.asarray(index, dtype=float)
+        return lttb_indices(x, values, max_points)
+    raise ValueError(f"Méthode de sous-échantillonnage inconnue: {method}")
@@ -0,0 +1,165 @@
+"""
+分析结果的历史数据库 (SQLite)
+
+每次计算出的 run_analysis 结果 (评分、指标、信号、时间戳) 都追加到 analyses 表,
+按 (ticker, date) 和 date 建立索引, 仪表盘据此绘制评分随时间的变化,
+并查询最近转为某个建议 (例如 VENTE) 的 ticker。
+
+数据时间戳相同的结果只保存一次, 仪表盘和 batch.py 的多个工作进程可以同时写入
+(WAL 模式, 写入时等待锁)。
+"""
+
+import os
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import SCORE_HISTORY_DB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticker TEXT NOT NULL,
+    company_name TEXT,
+    date TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data_as_of TEXT,
+    fundamentals_as_of REAL,
+    current_price REAL,
+    total_score REAL,
+    fundamental_score REAL,
+    technical_score REAL,
+    recommendation TEXT,
+    action TEXT,
+    metrics TEXT,
+    detailed_scores TEXT,
+    signals TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_ticker_date ON analyses (ticker, date);
+CREATE INDEX IF NOT EXISTS idx_analyses_date ON analyses (date);
+"""
+
+# 数据时间戳的唯一索引; SQLite 中 NULL 互不相等, 所以用 COALESCE 把缺失的时间戳视为同一个值
+SCHEMA_VERSION = 1
+MIGRATION = """
+DROP INDEX IF EXISTS idx_analyses_as_of;
+DELETE FROM analyses WHERE id NOT IN (
+    SELECT MIN(id) FROM analyses
+    GROUP BY ticker, COALESCE(data_as_of, ''), COALESCE(fundamentals_as_of, '')
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_analyses_as_of_key
+    ON analyses (ticker, COALESCE(data_as_of, ''), COALESCE(fundamentals_as_of, ''));
+PRAGMA user_version = 1;
+"""
+
+HISTORY_COLUMNS = [
+    'date', 'timestamp', 'current_price', 'total_score', 'fundamental_score',
+    'technical_score', 'recommendation', 'action'
+]
+
+
+def recommendation_action(recommendation):
+    """去掉建议前面的图标: '🔴 VENTE' -> 'VENTE'"""
+    return recommendation.split(" ", 1)[-1] if recommendation else recommendation
+
+
+def _to_json(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ScoreHistory:
+    """analyses 表的读写; 每次操作使用独立的连接, 可在多个线程/进程中共用"""
+
+    def __init__(self, path=SCORE_HISTORY_DB):
+        self.path = path
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            if connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                # 旧版本的唯一索引不包含 NULL 时间戳: 删除已有的重复记录 (保留最早的一条) 后重建
+                connection.executescript(MIGRATION)
+            self._initialized = True
+        return connection
+
+    def append(self, result):
+        """追加一个 run_analysis 结果, 已保存过相同数据时间戳的结果时忽略"""
+        timestamp = result['timestamp']
+        # date 为行情的交易日, 没有行情时间戳时使用分析时间
+        date = (result.get('data_as_of') or timestamp)[:10]
+        dumps = lambda value: json.dumps(value, ensure_ascii=False, default=_to_json)
+        signals = {
+            'fundamental': result.get('fundamental_signals', {}),
+            'technical': result.get('technical_signals', {})
+        }
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                """
+                INSERT OR IGNORE INTO analyses (
+                    ticker, company_name, date, timestamp, data_as_of, fundamentals_as_of,
+                    current_price, total_score, fundamental_score, technical_score,
+                    recommendation, action, metrics, detailed_scores, signals
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    result['ticker'], result.get('company_name'), date, timestamp,
+                    result.get('data_as_of'), result.get('fundamentals_as_of'),
+                    float(result['current_price']) if result.get('current_price') is not None else None,
+                    float(result['total_score']), float(result['fundamental_score']),
+                    float(result['technical_score']), result['recommendation'],
+                    recommendation_action(result['recommendation']),
+                    dumps(result.get('metrics', {})), dumps(result.get('detailed_scores', {})),
+                    dumps(signals)
+                )
+            )
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def history(self, ticker, since=None):
+        """一个 ticker 的评分历史 (按日期排序), since 为 'YYYY-MM-DD' 或 date/datetime"""
+        sql = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM analyses WHERE ticker = ?"
+        params = [ticker]
+        if since is not None:
+            sql += " AND date >= ?"
+            params.append(str(since)[:10])
+        history = self._query(sql + " ORDER BY date, id", params)
+        history['date'] = pd.to_datetime(history['date'])
+        return history
+
+    def flipped_to(self, action="VENTE", since=None):
+        """自 since (默认7天前) 起建议转为 action 的 ticker
+
+        每个 ticker 的每条记录与它的上一条记录比较, 上一条不是 action 而这一条是时计为一次转换。
+        返回 DataFrame: ticker, company_name, date, previous, recommendation, total_score
+        """
+        if since is None:
+            since = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
+        since = str(since)[:10]
+        return self._query(
+            """
+            WITH ordered AS (
+                SELECT ticker, company_name, date, recommendation, action, total_score,
+                       LAG(action) OVER (PARTITION BY ticker ORDER BY date, id) AS previous
+                FROM analyses
+                WHERE ticker IN (SELECT DISTINCT ticker FROM analyses WHERE date >= ?)
+            )
+            SELECT ticker, company_name, date, previous, recommendation, total_score
+            FROM ordered
+            WHERE date >= ? AND action = ? AND previous IS NOT NULL AND previous != ?
+            ORDER BY date DESC, ticker
+            """,
+            (since, since, action, action)
+        )
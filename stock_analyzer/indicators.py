@@ -0,0 +1,372 @@
+"""
+向量化技术指标引擎
+
+输入为宽表价格矩阵 close (日期 × ticker), 所有指标对所有 ticker 一次性计算,
+评分规则与信号文案与 StockAnalyzer.calculate_technical_indicators 完全一致。
+"""
+
+import numpy as np
+import pandas as pd
+
+from config import TECHNICAL_PARAMS
+
+# 少于该数量的K线不做技术分析
+MIN_BARS = 50
+
+TECHNICAL_INDICATORS = ['rsi', 'moving_averages', 'macd', 'bollinger_bands', 'momentum']
+
+RSI_SIGNALS = {
+    5: "🟢 FORT SURVENDU - Signal d'achat potentiel",
+    4: "🟡 SURVENDU - Opportunité d'achat modérée",
+    3: "⚪ NEUTRE - Pas de signal directionnel clair",
+    2: "🟠 SURACHETÉ - Prudence recommandée",
+    1: "🔴 FORT SURACHETÉ - Signal de vente potentiel"
+}
+
+MA_SIGNALS = {
+    5: "🟢 FORTE TENDANCE HAUSSIÈRE - Configuration optimale",
+    4: "🟡 TENDANCE HAUSSIÈRE - Signaux positifs",
+    3: "⚪ TENDANCE NEUTRE POSITIVE - Attente de confirmation",
+    2: "🟠 TENDANCE INCERTAINE - Risques émergents",
+    1: "🔴 TENDANCE BAISSIÈRE - Configuration défavorable"
+}
+
+MACD_SIGNALS = {
+    5: "🟢 FORT SIGNAL HAUSSIER - Momentum accélérant",
+    4: "🟡 SIGNAL HAUSSIER - Croisement positif confirmé",
+    3: "⚪ TRANSITION - Point d'inflexion potentiel",
+    2: "🟠 SIGNAL BAISSIER - Momentum décélérant",
+    1: "🔴 FORT SIGNAL BAISSIER - Momentum négatif fort"
+}
+
+BB_SIGNALS = {
+    5: "🟢 FORT SURVENDU - Rebond probable",
+    4: "🟡 SURVENDU MODÉRÉ - Opportunité intéressante",
+    3: "⚪ ZONE NEUTRE - Équilibre acheteurs/vendeurs",
+    2: "🟠 SURACHETÉ MODÉRÉ - Prudence nécessaire",
+    1: "🔴 FORT SURACHETÉ - Correction probable"
+}
+
+BB_VOLATILITY_SIGNALS = {
+    'low': " | 📏 FAIBLE VOLATILITÉ (Compression - mouvement imminent)",
+    'high': " | 🌊 FORTE VOLATILITÉ (Expansion - mouvement en cours)",
+    'normal': " | 📊 VOLATILITÉ NORMALE"
+}
+
+# 随结果一起返回的指标序列 (供图表、历史视图和导出复用)
+SERIES_COLUMNS = [
+    'close', 'ma_20', 'ma_50', 'ma_200', 'rsi',
+    'macd_line', 'macd_signal', 'macd_histogram',
+    'bb_upper', 'bb_middle', 'bb_lower'
+]
+
+MOMENTUM_SIGNALS = {
+    5: "🟢 FORT MOMENTUM HAUSSIER - Accélération",
+    4: "🟡 BON MOMENTUM HAUSSIER - Croissance soutenue",
+    3: "⚪ MOMENTUM NEUTRE - Stabilité",
+    2: "🟠 MOMENTUM BAISSIER - Légère pression",
+    1: "🔴 FORT MOMENTUM BAISSIER - Correction"
+}
+
+
+def empty_technical_result():
+    return {'total_score': 0, 'detailed_scores': {}, 'metrics': {}, 'signals': {}}
+
+
+def resolve_params(params=None):
+    """以 TECHNICAL_PARAMS 为默认值补全参数"""
+    return {**TECHNICAL_PARAMS, **(params or {})}
+
+
+def required_bars(params=None):
+    """所有指标都使用完整窗口 (不用中期均线代替长期均线) 所需的K线数, 默认参数下为 200"""
+    p = resolve_params(params)
+    return max(
+        MIN_BARS, p['ma_short'], p['ma_medium'], p['ma_long'], p['bb_window'],
+        p['rsi_window'] + 1, p['macd_slow'] + p['macd_signal'], p['momentum_lookback']
+    )
+
+
+def compute_indicator_frames(close, params=None):
+    """一次性计算所有 ticker 的完整指标序列
+
+    close: DataFrame, 索引为日期, 每列一个 ticker。
+    params: 指标参数, 缺省项取 TECHNICAL_PARAMS。键名 ma_20/ma_50/ma_200 分别对应
+    ma_short/ma_medium/ma_long 窗口。
+    返回 {指标名: DataFrame}, 每个 DataFrame 与 close 形状相同;
+    第 t 行的值等于只用前 t 行数据计算出的值。
+    """
+    p = resolve_params(params)
+    close = close.astype(float)
+    bars = close.notna().cumsum()
+
+    # 1. RSI
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=p['rsi_window']).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=p['rsi_window']).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+
+    # 2. 移动平均线 (K线不足 ma_long 时用中期均线代替长期均线)
+    ma_20 = close.rolling(window=p['ma_short']).mean()
+    ma_50 = close.rolling(window=p['ma_medium']).mean()
+    ma_200 = close.rolling(window=p['ma_long']).mean().where(bars >= p['ma_long'], ma_50)
+
+    # 3. MACD
+    exp12 = close.ewm(span=p['macd_fast'], adjust=False).mean()
+    exp26 = close.ewm(span=p['macd_slow'], adjust=False).mean()
+    macd_line = exp12 - exp26
+    macd_signal = macd_line.ewm(span=p['macd_signal'], adjust=False).mean()
+    macd_histogram = macd_line - macd_signal
+
+    # 4. 布林带
+    if p['bb_window'] == p['ma_short']:
+        bb_middle = ma_20
+    else:
+        bb_middle = close.rolling(window=p['bb_window']).mean()
+    bb_std = close.rolling(window=p['bb_window']).std()
+    bb_upper = bb_middle + (bb_std * p['bb_k'])
+    bb_lower = bb_middle - (bb_std * p['bb_k'])
+    bb_position = (close - bb_lower) / (bb_upper - bb_lower)
+    bb_width = (bb_upper - bb_lower) / bb_middle * 100
+
+    # 5. 动量: momentum_lookback 根K线前的价格 (含当前K线), 历史不足时取第一根
+    lookback = p['momentum_lookback']
+    first_close = close.bfill().iloc[0]
+    price_1m_ago = close.shift(lookback - 1).where(bars > lookback, first_close, axis=1)
+    price_change = ((close - price_1m_ago) / price_1m_ago) * 100
+
+    return {
+        'close': close,
+        'bars': bars,
+        'rsi': rsi,
+        'ma_20': ma_20,
+        'ma_50': ma_50,
+        'ma_200': ma_200,
+        'macd_line': macd_line,
+        'macd_signal': macd_signal,
+        'macd_histogram': macd_histogram,
+        'bb_upper': bb_upper,
+        'bb_lower': bb_lower,
+        'bb_middle': bb_middle,
+        'bb_position': bb_position,
+        'bb_width': bb_width,
+        'price_change': price_change
+    }
+
+
+def score_rsi(rsi):
+    rsi = np.where(np.isnan(rsi), 50, rsi)
+    return np.select([rsi < 30, rsi < 40, rsi < 60, rsi < 70], [5, 4, 3, 2], 1)
+
+
+def score_moving_averages(price, ma_20, ma_50, ma_200):
+    return np.select(
+        [
+            (price > ma_20) & (ma_20 > ma_50) & (ma_50 > ma_200),
+            (price > ma_20) & (ma_20 > ma_50),
+            ma_20 > ma_50,
+            price > ma_50
+        ],
+        [5, 4, 3, 2], 1
+    )
+
+
+def score_macd(macd_line, macd_signal, macd_histogram):
+    return np.select(
+        [
+            (macd_line > macd_signal) & (macd_histogram > 0) & (macd_line > 0),
+            macd_line > macd_signal,
+            np.abs(macd_line - macd_signal) < 0.001,
+            (macd_line < macd_signal) & (macd_line > 0)
+        ],
+        [5, 4, 3, 2], 1
+    )
+
+
+def score_bollinger(bb_position):
+    return np.select(
+        [bb_position < 0.1, bb_position < 0.3, bb_position < 0.7, bb_position < 0.9],
+        [5, 4, 3, 2], 1
+    )
+
+
+def score_momentum(price_change):
+    return np.select(
+        [price_change >= 15, price_change >= 8, price_change >= -5, price_change >= -8],
+        [5, 4, 3, 2], 1
+    )
+
+
+def volatility_label(bb_width):
+    return np.select([bb_width < 8, bb_width > 20], ['low', 'high'], 'normal')
+
+
+def score_arrays(values):
+    """对指标数组 (任意形状) 计算五项评分, 返回 {指标: 整数数组}"""
+    with np.errstate(invalid='ignore'):
+        return {
+            'rsi': score_rsi(values['rsi']),
+            'moving_averages': score_moving_averages(
+                values['close'], values['ma_20'], values['ma_50'], values['ma_200']
+            ),
+            'macd': score_macd(values['macd_line'], values['macd_signal'], values['macd_histogram']),
+            'bollinger_bands': score_bollinger(values['bb_position']),
+            'momentum': score_momentum(values['price_change'])
+        }
+
+
+def technical_total(scores):
+    """五项评分的平均值"""
+    return sum(scores[name] for name in TECHNICAL_INDICATORS) / len(TECHNICAL_INDICATORS)
+
+
+def latest_values(frames, position=-1):
+    """取出每个指标在某一行 (默认最后一行) 的值, {指标: 一维数组 (按 ticker)}"""
+    return {name: frame.iloc[position].to_numpy(dtype=float) for name, frame in frames.items()}
+
+
+def compute_ticker_frames(close, params=None):
+    """与 compute_indicator_frames 相同, 但每个 ticker 只在自己有价格的行上计算
+
+    宽表中某个 ticker 缺少部分交易日 (停牌、数据源漏掉的日期) 时, 滚动窗口和 EWM 按它自己的
+    K线计算, 与对该列 dropna() 后单独计算的结果一致; 缺失的行为 NaN。
+    没有缺口的 ticker (包括上市较晚、前面为 NaN 的) 仍然一起向量化计算。
+    """
+    frames = compute_indicator_frames(close, params)
+    close = frames['close']
+    started = close.notna().cummax()
+    gapped = np.flatnonzero((started & close.isna()).any().to_numpy())
+    for j in gapped:
+        own = compute_indicator_frames(close.iloc[:, [j]].dropna(), params)
+        for name, frame in frames.items():
+            if name not in ('close', 'bars'):
+                frame.iloc[:, j] = own[name].iloc[:, 0].reindex(close.index).to_numpy()
+    return frames
+
+
+def last_bar_values(frames):
+    """每个 ticker 在自己最后一根有价格的K线上的指标值, {指标: 一维数组 (按 ticker)}
+
+    没有任何价格的 ticker 取最后一行 (close 为 NaN)。
+    """
+    has_price = frames['close'].notna().to_numpy()
+    rows = len(has_price) - 1 - np.argmax(has_price[::-1], axis=0)
+    columns = np.arange(has_price.shape[1])
+    return {name: frame.to_numpy(dtype=float)[rows, columns] for name, frame in frames.items()}
+
+
+def build_technical_result(values, scores, i):
+    """为第 i 个 ticker 组装与 calculate_technical_indicators 相同结构的结果字典"""
+    current_price = values['close'][i]
+    current_rsi = values['rsi'][i]
+    if np.isnan(current_rsi):
+        current_rsi = 50
+
+    ma_20 = values['ma_20'][i]
+    ma_50 = values['ma_50'][i]
+    detailed_scores = {name: int(scores[name][i]) for name in TECHNICAL_INDICATORS}
+    bb_signal = BB_SIGNALS[detailed_scores['bollinger_bands']] + \
+        BB_VOLATILITY_SIGNALS[str(volatility_label(values['bb_width'][i]))]
+
+    metrics = {
+        'rsi': round(current_rsi, 1),
+        'ma_20': round(ma_20, 2),
+        'ma_50': round(ma_50, 2),
+        'ma_200': round(values['ma_200'][i], 2),
+        'price_vs_ma20': round(((current_price - ma_20) / ma_20) * 100, 1),
+        'golden_cross': ma_20 > ma_50,
+        'macd_line': round(values['macd_line'][i], 4),
+        'macd_signal': round(values['macd_signal'][i], 4),
+        'macd_histogram': round(values['macd_histogram'][i], 4),
+        'bb_position': round(values['bb_position'][i], 3),
+        'bb_width': round(values['bb_width'][i], 1),
+        'bb_upper': round(values['bb_upper'][i], 2),
+        'bb_lower': round(values['bb_lower'][i], 2),
+        'bb_middle': round(values['bb_middle'][i], 2),
+        'price_change_1m': round(values['price_change'][i], 1),
+        'current_price': round(current_price, 2)
+    }
+
+    signals = {
+        'rsi': RSI_SIGNALS[detailed_scores['rsi']],
+        'moving_averages': MA_SIGNALS[detailed_scores['moving_averages']],
+        'macd': MACD_SIGNALS[detailed_scores['macd']],
+        'bollinger_bands': bb_signal,
+        'momentum': MOMENTUM_SIGNALS[detailed_scores['momentum']]
+    }
+
+    return {
+        'total_score': round(sum(detailed_scores.values()) / len(detailed_scores), 2),
+        'detailed_scores': detailed_scores,
+        'metrics': metrics,
+        'signals': signals
+    }
+
+
+def indicator_series(frames, ticker):
+    """某个 ticker 的完整指标序列, 紧凑的 float32 列式 DataFrame"""
+    return pd.DataFrame(
+        {name: frames[name][ticker].to_numpy(dtype=np.float32) for name in SERIES_COLUMNS},
+        index=frames['close'].index
+    )
+
+
+def latest_technical_results(close, with_series=False, params=None):
+    """对宽表中每个 ticker 在最后一个日期进行技术分析
+
+    返回 {ticker: 结果字典}, 与对每一列 dropna() 后逐个调用 calculate_technical_indicators
+    的结果相同: 缺少部分交易日的 ticker 按自己的K线计算, 最后一个日期没有价格时取它自己的
+    最后一根K线。没有价格或K线不足 MIN_BARS 的 ticker 得到空结果。
+    with_series=True 时结果中还包含 'series': 完整的指标序列 (见 indicator_series)。
+    """
+    frames = compute_ticker_frames(close, params)
+    values = last_bar_values(frames)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = score_arrays(values)
+
+    results = {}
+    for i, ticker in enumerate(close.columns):
+        if np.isnan(values['close'][i]) or values['bars'][i] < MIN_BARS:
+            results[ticker] = empty_technical_result()
+        else:
+            results[ticker] = build_technical_result(values, scores, i)
+            if with_series:
+                results[ticker]['series'] = indicator_series(frames, ticker)
+    return results
+
+
+def technical_score_history(close, params=None):
+    """每个日期、每个 ticker 的技术总分 (日期 × ticker)
+
+    第 t 行等于用前 t 行数据调用 calculate_technical_indicators 得到的 total_score,
+    K线不足 MIN_BARS 的位置为 0。
+    """
+    frames = compute_indicator_frames(close, params)
+    values = {name: frame.to_numpy(dtype=float) for name, frame in frames.items()}
+    scores = score_arrays(values)
+
+    total = np.round(technical_total(scores), 2)
+    valid = ~np.isnan(values['close']) & (values['bars'] >= MIN_BARS)
+    return pd.DataFrame(np.where(valid, total, 0.0), index=close.index, columns=close.columns)
+
+
+def technical_score_table(close, params=None):
+    """最后一个日期的技术评分表: 每行一个 ticker, 列为五项评分、technical_score、bars 和 valid
+
+    评分与 latest_technical_results 相同 (每个 ticker 按自己的K线计算)。
+    bars 为该 ticker 的K线数; 没有价格或K线不足 MIN_BARS 时 valid 为 False, 评分为 0,
+    调用方应把这些 ticker 作为错误报告, 而不是参与排名。
+    """
+    frames = compute_ticker_frames(close, params)
+    values = last_bar_values(frames)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = score_arrays(values)
+
+    table = pd.DataFrame(scores, index=close.columns)
+    table['technical_score'] = technical_total(scores).round(2)
+    valid = ~np.isnan(values['close']) & (values['bars'] >= MIN_BARS)
+    table.loc[~valid, :] = 0
+    table['bars'] = values['bars'].astype(int)
+    table['valid'] = valid
+    return table
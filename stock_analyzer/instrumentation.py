@@ -0,0 +1,158 @@
+"""
+分阶段计时
+
+一次请求 (一次页面渲染、batch.py 中的一个 ticker) 用 trace() 包住, 其中的各阶段用 span() 或 @timed 标记:
+
+    with trace("analyse", company="Airbus") as current:
+        result = analyzer.run_analysis("Airbus")     # get_stock_data / provider.info / 指标计算 ...
+    current.rows()                                   # 每个阶段一行: 名称、层级、开始时间、耗时
+
+当前的 trace 和嵌套层级保存在 contextvars 中, 每个 Streamlit 会话 (脚本线程) 互不影响;
+没有活动的 trace 时, span() 只做一次 contextvar 读取, 开销可以忽略。
+在线程池中执行的代码只有以 contextvars.copy_context().run 提交时才计入调用者的 trace
+(如 get_stock_data 中与行情并发的基本面阶段), 其阶段嵌套在提交时所在的阶段之下;
+直接提交的任务 (如 fetch_universe 的并发下载) 不计入。
+
+trace 结束时输出一行 JSON 日志 (logger "stock_analyzer.timing", INFO 级别);
+设置环境变量 STOCK_ANALYZER_TIMING_LOG=1 时输出到标准错误。
+"""
+
+import sys
+import json
+import time
+import logging
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from config import TIMING_LOG
+
+logger = logging.getLogger("stock_analyzer.timing")
+if TIMING_LOG and not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_current_trace = contextvars.ContextVar("stock_analyzer_trace", default=None)
+# 当前所在的阶段; 与 trace 分开保存, 在不同线程中并发执行的阶段各自记录其上一级阶段
+_current_span = contextvars.ContextVar("stock_analyzer_span", default=None)
+
+
+class Trace:
+    """一次请求中按开始顺序记录的各阶段耗时"""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def _ordered(self):
+        """按树的先序排列的阶段: 每个阶段紧跟在其上一级阶段之后 (并发的阶段也是如此)"""
+        children = {}
+        for span in self.spans:
+            children.setdefault(id(span['parent']) if span['parent'] is not None else None, []).append(span)
+
+        ordered = []
+        stack = list(reversed(children.get(None, [])))
+        while stack:
+            span = stack.pop()
+            ordered.append(span)
+            stack.extend(reversed(children.get(id(span), [])))
+        return ordered
+
+    def rows(self):
+        """每个阶段一行: name, depth (1 为最外层), start_ms (相对于 trace 开始), ms"""
+        return [
+            {
+                'name': span['name'],
+                'depth': span['depth'],
+                'start_ms': round((span['start'] - self.start) * 1e3, 3),
+                'ms': round(span['duration'] * 1e3, 3) if span['duration'] is not None else None,
+                **span['attrs']
+            }
+            for span in self._ordered()
+        ]
+
+    def totals(self):
+        """按阶段名称汇总的耗时 (毫秒); 同名阶段嵌套时只计最外层"""
+        totals = {}
+        open_names = []
+        for span in self._ordered():
+            while open_names and open_names[-1][1] >= span['depth']:
+                open_names.pop()
+            if span['duration'] is not None and span['name'] not in (name for name, _ in open_names):
+                totals[span['name']] = totals.get(span['name'], 0.0) + span['duration'] * 1e3
+            open_names.append((span['name'], span['depth']))
+        return {name: round(ms, 3) for name, ms in totals.items()}
+
+    @property
+    def total_ms(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return round(duration * 1e3, 3)
+
+    def to_dict(self):
+        return {'event': 'trace', 'name': self.name, **self.attrs, 'total_ms': self.total_ms, 'spans': self.rows()}
+
+
+def current_trace():
+    """当前上下文中活动的 trace, 没有时返回 None"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace(name, **attrs):
+    """开始一次请求的计时; 已经在一个 trace 中时等同于 span()"""
+    if _current_trace.get() is not None:
+        with span(name, **attrs):
+            yield _current_trace.get()
+        return
+
+    current = Trace(name, **attrs)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_trace.reset(token)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(current.to_dict(), ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(name, **attrs):
+    """在当前 trace 中记录一个阶段; 没有活动的 trace 时不做任何事"""
+    current = _current_trace.get()
+    if current is None:
+        yield
+        return
+
+    parent = _current_span.get()
+    record = {
+        'name': name, 'depth': parent['depth'] + 1 if parent is not None else 1, 'parent': parent,
+        'start': time.perf_counter(), 'duration': None, 'attrs': attrs
+    }
+    current.spans.append(record)
+    token = _current_span.set(record)
+    try:
+        yield
+    finally:
+        _current_span.reset(token)
+        record['duration'] = time.perf_counter() - record['start']
+
+
+def timed(name=None):
+    """把函数的每次调用记录为一个阶段 (默认以函数名命名)"""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current_trace.get() is None:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
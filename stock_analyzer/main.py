@@ -2,47 +2,133 @@
 主程序入口
 """
 
+import os
+import uuid
+
 import streamlit as st
 
-from analyzer import StockAnalyzer
+from instrumentation import current_trace, trace
+from metrics import PAGE_RENDER_SECONDS, sessions, start_exporter
 from visualization import Visualizer
-from utils import setup_page_config, create_sidebar
-from config import COMPANIES, TEAM_MEMBERS
+from utils import (
+    setup_page_config, create_sidebar, create_mode_selector, create_screener_sidebar, create_debug_toggle
+)
+from config import COMPANIES, TEAM_MEMBERS, TIMEFRAMES, SCORE_HISTORY_DB
+
+@st.cache_resource
+def get_analyzer():
+    """进程内所有浏览器会话共享的分析器 (及其行情/基本面/结果缓存)
+
+    batch.py 预计算并写入 ResultsStore 的结果会被直接复用, 每次新的分析结果都追加到 ScoreHistory。
+    在第一次分析时才导入 (pandas / numpy 等), 欢迎页面不需要加载它们。
+    """
+    from analyzer import StockAnalyzer
+    from providers import storage_dirs
+    from results_store import ResultsStore
+    from history_db import ScoreHistory
+    # 回放模式 (STOCK_ANALYZER_REPLAY_DIR) 使用独立的缓存、结果和评分历史
+    cache_dir, results_dir = storage_dirs()
+    return StockAnalyzer(
+        results_store=ResultsStore(results_dir),
+        score_history=ScoreHistory(os.path.join(results_dir, os.path.basename(SCORE_HISTORY_DB))),
+        cache_dir=cache_dir
+    )
+
+@st.cache_resource
+def start_metrics_exporter():
+    """每个进程只启动一次运行指标的导出 (HTTP 端点 / 文本文件, 见 metrics 模块)"""
+    return start_exporter()
+
+@st.cache_resource
+def get_visualizer():
+    return Visualizer()
 
 class Dashboard:
     def __init__(self):
-        self.analyzer = StockAnalyzer()
-        self.visualizer = Visualizer()
+        self.visualizer = get_visualizer()
         self.companies = COMPANIES
         self.team_members = TEAM_MEMBERS
 
+    @property
+    def analyzer(self):
+        return get_analyzer()
+
     def run(self):
-        """运行主仪表盘"""
+        """运行主仪表盘
+
+        每次渲染记录为一个 trace; 打开侧边栏的调试开关时显示各阶段的耗时。
+        渲染耗时和活动会话计入运行指标。
+        """
         setup_page_config()
+        start_metrics_exporter()
+        sessions.touch(st.session_state.setdefault('session_id', uuid.uuid4().hex))
+        mode = create_mode_selector()
+        debug = create_debug_toggle()
         
-        # 侧边栏
-        selected_company, analyze_btn = create_sidebar(self.companies, self.team_members)
+        with trace("page", mode=mode) as current, PAGE_RENDER_SECONDS.labels(mode).time():
+            self.render(mode, current)
         
+        if debug:
+            self.visualizer.display_timings(current)
+
+    def render(self, mode, current):
+        """渲染页面; current 为本次渲染的 trace"""
         # 主界面
         st.title("📊 Analyse Boursière Complète - Projet de Groupe")
         st.markdown("**Système Expert d'Aide à la Décision d'Investissement**")
         st.markdown("---")
         
+        if mode == "Screener":
+            self.run_screener()
+            return
+        
+        # 侧边栏
+        selected_company, interval, analyze_btn, refresh_btn = create_sidebar(
+            self.companies, self.team_members, TIMEFRAMES
+        )
+        
         # 默认显示或分析结果
-        if not analyze_btn and 'last_analysis' not in st.session_state:
+        # 普通的重新渲染 (如展开折叠面板) 直接复用缓存的分析结果, 只有刷新按钮才强制重新下载
+        if not analyze_btn and not refresh_btn and 'last_analysis' not in st.session_state:
             self.visualizer.display_welcome()
         else:
-            if analyze_btn or 'last_analysis' in st.session_state:
+            if analyze_btn or refresh_btn or 'last_analysis' in st.session_state:
                 company_to_analyze = selected_company
+                current.attrs.update(company=company_to_analyze, interval=interval)
                 
                 with st.spinner(f"🔍 Analyse en cours pour {company_to_analyze}..."):
-                    result = self.analyzer.run_analysis(company_to_analyze)
+                    result = self.analyzer.run_analysis(
+                        company_to_analyze, force_refresh=refresh_btn, interval=interval
+                    )
                 
                 if 'error' in result:
                     st.error(f"❌ Erreur: {result['error']}")
                 else:
                     st.session_state.last_analysis = result
-                    self.visualizer.display_analysis_result(result)
+                    score_history = self.analyzer.score_history.history(result['ticker'])
+                    self.visualizer.display_analysis_result(result, score_history)
+
+    def run_screener(self):
+        """筛选器模式: 对整个股票池排名"""
+        from screener import Screener, available_universes, get_universe
+        
+        universe_name, run_btn, refresh_btn = create_screener_sidebar(available_universes())
+        
+        last = st.session_state.get('last_screener')
+        if run_btn or refresh_btn or (last is not None and last['universe'] != universe_name):
+            universe = get_universe(universe_name)
+            current_trace().attrs.update(universe=universe_name, tickers=len(universe))
+            with st.spinner(f"🔍 Screener en cours sur {len(universe)} entreprises..."):
+                result = Screener(self.analyzer).run(universe, force_refresh=refresh_btn)
+            last = {'universe': universe_name, 'result': result}
+            st.session_state.last_screener = last
+        
+        if last is None:
+            st.info("💡 **Instructions**: Choisissez un univers d'actions dans la barre latérale et cliquez sur 'Lancer le Screener'")
+        else:
+            self.visualizer.display_screener(
+                last['result'], last['universe'], self.analyzer.score_history.flipped_to("VENTE")
+            )
 
 def main():
     dashboard = Dashboard()
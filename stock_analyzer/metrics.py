@@ -0,0 +1,391 @@
+"""
+运行指标 (Prometheus 文本格式)
+
+仪表盘作为常驻服务运行时, 用这些指标观察它的状态:
+    stock_analyzer_fetch_seconds          数据源调用耗时 (按方法和 ticker)
+    stock_analyzer_upstream_errors_total  数据源调用失败次数
+    stock_analyzer_cache_requests_total   各级缓存的命中 / 未命中次数
+    stock_analyzer_analysis_seconds       评分计算耗时 (不含下载)
+    stock_analyzer_page_render_seconds    一次页面渲染的耗时
+    stock_analyzer_active_sessions        最近 METRICS_SESSION_WINDOW 秒内有活动的浏览器会话数
+
+指标由 StockAnalyzer 和 Dashboard 中的钩子更新, 通过以下方式之一导出 (见 start_exporter):
+- STOCK_ANALYZER_METRICS_PORT:     本地 HTTP 端点 http://127.0.0.1:<port>/metrics
+- STOCK_ANALYZER_METRICS_TEXTFILE: 定期写入的文本文件 (供 node_exporter 的 textfile collector 读取)
+
+实现只依赖标准库; 指标值保存在进程内, batch.py 的工作进程各自计数, 不会被导出。
+"""
+
+import os
+import abc
+import math
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import (
+    METRICS_ADDR, METRICS_PORT, METRICS_TEXTFILE, METRICS_TEXTFILE_INTERVAL, METRICS_SESSION_WINDOW
+)
+
+# 耗时直方图的默认桶 (秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Registry:
+    """进程内的指标集合"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """所有指标的 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric(abc.ABC):
+    """带标签的指标: labels(...) 返回一组标签值对应的子指标; 没有标签时直接调用子指标的方法"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: labels attendus {self.labelnames}")
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _items(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def _value_samples(self):
+        """每组标签一行的样本 (子指标提供 get())"""
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"
+            for values, child in self._items()
+        ]
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """一组标签值对应的子指标"""
+
+    @abc.abstractmethod
+    def samples(self):
+        """Prometheus 文本格式的样本行"""
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Un compteur ne peut pas diminuer")
+        with self._lock:
+            self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def set_function(self, function):
+        """读取指标时调用 function() 取值 (如当前的会话数)"""
+        self.function = function
+
+    def get(self):
+        return float(self.function()) if self.function is not None else self.value
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return self._value_samples()
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def samples(self):
+        return self._value_samples()
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Histogram(_Metric):
+    """观测值 (如耗时) 的分布, 按 buckets 累计计数"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if not math.isinf(bound)))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts + [None]):
+                cumulative = count if bucket_count is None else cumulative + bucket_count
+                labels = _format_labels(self.labelnames, values, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {_format_value(count)}")
+        return lines
+
+
+class SessionTracker:
+    """最近 window 秒内有活动的会话 (Streamlit 没有公开的会话结束事件, 以最后一次渲染时间判断)"""
+
+    def __init__(self, window=METRICS_SESSION_WINDOW):
+        self.window = window
+        self._last_seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, session_id):
+        with self._lock:
+            self._last_seen[session_id] = time.monotonic()
+
+    def active(self):
+        cutoff = time.monotonic() - self.window
+        with self._lock:
+            for session_id in [key for key, seen in self._last_seen.items() if seen < cutoff]:
+                del self._last_seen[session_id]
+            return len(self._last_seen)
+
+
+FETCH_SECONDS = Histogram(
+    "stock_analyzer_fetch_seconds", "Durée des appels au fournisseur de données", ["method", "ticker"]
+)
+UPSTREAM_ERRORS = Counter(
+    "stock_analyzer_upstream_errors_total", "Appels au fournisseur de données en erreur", ["method"]
+)
+CACHE_REQUESTS = Counter(
+    "stock_analyzer_cache_requests_total", "Requêtes aux caches (hit / miss)", ["cache", "result"]
+)
+ANALYSIS_SECONDS = Histogram(
+    "stock_analyzer_analysis_seconds", "Durée du calcul des scores (hors téléchargement)", ["interval"]
+)
+PAGE_RENDER_SECONDS = Histogram(
+    "stock_analyzer_page_render_seconds", "Durée d'un rendu de page du tableau de bord", ["mode"]
+)
+ACTIVE_SESSIONS = Gauge(
+    "stock_analyzer_active_sessions", "Sessions actives sur la fenêtre METRICS_SESSION_WINDOW"
+)
+
+sessions = SessionTracker()
+ACTIVE_SESSIONS.set_function(sessions.active)
+
+
+def cache_result(cache, hit):
+    """记录一次缓存请求"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def render(registry=REGISTRY):
+    return registry.render()
+
+
+def write_textfile(path, registry=REGISTRY):
+    """原子地写入指标文件 (先写临时文件再重命名, 读取方不会看到写了一半的文件)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(temporary, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr=METRICS_ADDR, registry=REGISTRY):
+    """在后台线程中提供 GET /metrics, 返回 server (server.shutdown() 停止)"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_textfile_writer(path, interval=METRICS_TEXTFILE_INTERVAL, registry=REGISTRY):
+    """在后台线程中每 interval 秒写一次指标文件, 返回用于停止的 threading.Event"""
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_textfile(path, registry)
+            except OSError as e:
+                print(f"Erreur écriture des métriques: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=run, name="metrics-textfile", daemon=True).start()
+    return stop
+
+
+def start_exporter(port=METRICS_PORT, textfile=METRICS_TEXTFILE):
+    """按配置启动 HTTP 端点和 / 或指标文件的写入线程 (都未配置时不做任何事)
+
+    端口被占用等无法启动 HTTP 端点的情况只打印错误, 仪表盘照常运行 (没有 HTTP 导出)。
+    """
+    exporters = {}
+    if port:
+        try:
+            exporters['http'] = start_http_server(port)
+        except OSError as e:
+            print(f"Erreur démarrage du serveur de métriques {METRICS_ADDR}:{port}: {e}")
+    if textfile:
+        exporters['textfile'] = start_textfile_writer(textfile)
+    return exporters
@@ -0,0 +1,374 @@
+"""
+技术指标参数与评分权重的扫描优化
+
+对 TECHNICAL_PARAMS (RSI 窗口、均线窗口、MACD 跨度、布林带窗口与倍数、动量回看期)
+以及总分权重和推荐阈值做网格搜索或随机搜索, 每个组合都用 Backtester 回测,
+按指定的组合指标 (默认夏普比率) 排序返回最佳参数。
+
+    optimizer = ParameterOptimizer(close, fundamental_scores)
+    optimizer.grid_search({'rsi_window': [9, 14, 21], 'bb_k': [1.5, 2, 2.5]})
+    optimizer.random_search(DEFAULT_SPACE, n_iter=500, seed=0)
+
+参数组合之间共享中间结果 (见 SharedIndicators):
+- 价格的累加和只计算一次, 任意窗口的移动平均和标准差都由它求出
+- 每个 RSI 窗口 / EMA 跨度 / 动量回看期只计算一次
+- 每项评分按其依赖的参数缓存, 例如只改变 bb_k 不会重新计算其它四项评分
+组合按指标参数排序后分块交给进程池, 同一块中的组合共享同一个工作进程的缓存。
+"""
+
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import Backtester
+from indicators import (
+    MIN_BARS, TECHNICAL_INDICATORS, score_bollinger, score_macd, score_momentum,
+    score_moving_averages, score_rsi
+)
+from config import (
+    TECHNICAL_PARAMS, SCORE_WEIGHTS, BACKTEST_BUY_THRESHOLD, BACKTEST_SELL_THRESHOLD
+)
+
+# 除指标参数外, 总分权重和推荐阈值也可参与优化
+MODEL_PARAMS = {
+    'fundamental_weight': SCORE_WEIGHTS['fundamental'],
+    'buy_threshold': BACKTEST_BUY_THRESHOLD,
+    'sell_threshold': BACKTEST_SELL_THRESHOLD
+}
+
+# 每项评分依赖的参数
+SCORE_DEPENDENCIES = {
+    'rsi': ('rsi_window',),
+    'moving_averages': ('ma_short', 'ma_medium', 'ma_long'),
+    'macd': ('macd_fast', 'macd_slow', 'macd_signal'),
+    'bollinger_bands': ('bb_window', 'bb_k'),
+    'momentum': ('momentum_lookback',)
+}
+
+# 网格搜索的默认网格 (未列出的参数取默认值)
+DEFAULT_GRID = {
+    'rsi_window': [9, 14, 21],
+    'ma_short': [10, 20],
+    'ma_medium': [50, 100],
+    'ma_long': [150, 200],
+    'macd_fast': [8, 12],
+    'macd_slow': [21, 26],
+    'bb_k': [1.5, 2, 2.5],
+    'momentum_lookback': [10, 22, 44],
+    'fundamental_weight': [0.4, 0.6]
+}
+
+# 随机搜索的默认空间: 列表为候选值, 元组 (最小值, 最大值) 为区间 (两端都是整数时取整数)
+DEFAULT_SPACE = {
+    'rsi_window': (5, 30),
+    'ma_short': (5, 40),
+    'ma_medium': (30, 120),
+    'ma_long': (100, 250),
+    'macd_fast': (5, 20),
+    'macd_slow': (15, 40),
+    'macd_signal': (5, 15),
+    'bb_window': (10, 40),
+    'bb_k': (1.0, 3.0),
+    'momentum_lookback': (5, 66),
+    'fundamental_weight': [0.0, 0.2, 0.4, 0.6, 0.8],
+    'buy_threshold': [3.0, 3.5, 4.0],
+    'sell_threshold': [2.0, 2.5, 3.0]
+}
+
+# 越小越好的指标, 其余按降序排列
+LOWER_IS_BETTER = {'volatility'}
+
+
+def default_params():
+    """当前模型使用的全部参数"""
+    return {**TECHNICAL_PARAMS, **MODEL_PARAMS}
+
+
+def is_valid(params):
+    """排除无意义的组合 (短期均线须短于长期均线等)"""
+    return (
+        params['ma_short'] < params['ma_medium'] < params['ma_long']
+        and params['macd_fast'] < params['macd_slow']
+        and params['rsi_window'] >= 2 and params['bb_window'] >= 2
+        and params['momentum_lookback'] >= 1
+        and params['sell_threshold'] <= params['buy_threshold']
+        and 0 <= params['fundamental_weight'] <= 1
+    )
+
+
+def grid_combinations(grid):
+    """网格中所有有效的参数组合"""
+    names = list(grid)
+    combinations = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = {**default_params(), **dict(zip(names, values))}
+        if is_valid(params):
+            combinations.append(params)
+    return combinations
+
+
+def random_combinations(space, n_iter, seed=None):
+    """从参数空间中随机抽取 n_iter 个不重复的有效组合"""
+    rng = random.Random(seed)
+
+    def sample(choices):
+        if isinstance(choices, tuple):
+            low, high = choices
+            if isinstance(low, int) and isinstance(high, int):
+                return rng.randint(low, high)
+            return round(rng.uniform(low, high), 2)
+        return rng.choice(list(choices))
+
+    combinations, seen = [], set()
+    # 无效组合被丢弃, 尝试次数设上限, 避免空间过小时死循环
+    for _ in range(n_iter * 20):
+        if len(combinations) >= n_iter:
+            break
+        params = {**default_params(), **{name: sample(choices) for name, choices in space.items()}}
+        key = tuple(sorted(params.items()))
+        if key in seen or not is_valid(params):
+            continue
+        seen.add(key)
+        combinations.append(params)
+    return combinations
+
+
+def _technical_key(params):
+    return tuple(params[name] for name in TECHNICAL_PARAMS)
+
+
+def _evaluation_order(params):
+    """先按指标参数排序, 使指标参数相同的组合相邻 (SharedIndicators 只保留最近一组技术评分)"""
+    others = tuple(sorted((name, value) for name, value in params.items() if name not in TECHNICAL_PARAMS))
+    return _technical_key(params), others
+
+
+class SharedIndicators:
+    """一个价格宽表 (日期 × ticker) 上的指标缓存, 供所有参数组合共享
+
+    与 indicators.compute_indicator_frames 的计算方式相同, 但移动平均和标准差由
+    前缀和求出 (结果只有浮点舍入级别的差异), 且每个窗口/跨度的结果都被缓存。
+    """
+
+    def __init__(self, close):
+        self.close_frame = close.astype(float)
+        self.close = self.close_frame.to_numpy()
+        self.bars = np.cumsum(~np.isnan(self.close), axis=0)
+        self.first_close = self.close_frame.bfill().iloc[0].to_numpy() if len(close) else \
+            np.full(close.shape[1], np.nan)
+
+        # 以每列第一个有效价格为基准求前缀和, 减小浮点抵消误差
+        self._shift = np.nan_to_num(self.first_close)
+        self._price_sums = self._prefix_sums(self.close - self._shift)
+
+        delta = np.diff(self.close, axis=0, prepend=np.nan)
+        with np.errstate(invalid='ignore'):
+            self._gain_sums = self._prefix_sums(np.where(delta > 0, delta, 0.0))
+            self._loss_sums = self._prefix_sums(np.where(delta < 0, -delta, 0.0))
+
+        self._memo = {}
+        self._last_technical = (None, None)
+
+    @staticmethod
+    def _prefix_sums(values):
+        """(和, 平方和, 有效值个数) 的前缀和, 第 k 行为前 k 行的累计"""
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        zeros = np.zeros((1, values.shape[1]))
+        return (
+            np.vstack([zeros, filled.cumsum(axis=0)]),
+            np.vstack([zeros, (filled * filled).cumsum(axis=0)]),
+            np.vstack([zeros, valid.cumsum(axis=0)])
+        )
+
+    @staticmethod
+    def _window(prefix, window):
+        """以每一行结尾、长度为 window 的窗口内的累计值; 前 window-1 行为 NaN"""
+        out = np.full((prefix.shape[0] - 1, prefix.shape[1]), np.nan)
+        if window <= out.shape[0]:
+            out[window - 1:] = prefix[window:] - prefix[:-window]
+        return out
+
+    def _memoize(self, key, compute):
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    def _window_moments(self, prefix_sums, window):
+        total, total_sq, count = (self._window(prefix, window) for prefix in prefix_sums)
+        # 窗口内有缺失值时与 pandas rolling 一样返回 NaN
+        full = count == window
+        return np.where(full, total, np.nan), np.where(full, total_sq, np.nan)
+
+    def rolling_mean(self, window):
+        def compute():
+            total, _ = self._window_moments(self._price_sums, window)
+            return total / window + self._shift
+        return self._memoize(('mean', window), compute)
+
+    def rolling_std(self, window):
+        def compute():
+            total, total_sq = self._window_moments(self._price_sums, window)
+            variance = (total_sq - total * total / window) / (window - 1)
+            return np.sqrt(np.maximum(variance, 0.0))
+        return self._memoize(('std', window), compute)
+
+    def ema(self, span):
+        return self._memoize(
+            ('ema', span),
+            lambda: self.close_frame.ewm(span=span, adjust=False).mean().to_numpy()
+        )
+
+    def rsi(self, window):
+        def compute():
+            gain, _ = self._window_moments(self._gain_sums, window)
+            loss, _ = self._window_moments(self._loss_sums, window)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return 100 - (100 / (1 + gain / loss))
+        return self._memoize(('rsi', window), compute)
+
+    def macd(self, fast, slow, signal):
+        def compute():
+            line = self.ema(fast) - self.ema(slow)
+            signal_line = pd.DataFrame(line).ewm(span=signal, adjust=False).mean().to_numpy()
+            return line, signal_line, line - signal_line
+        return self._memoize(('macd', fast, slow, signal), compute)
+
+    def momentum(self, lookback):
+        def compute():
+            reference = np.full_like(self.close, np.nan)
+            if lookback - 1 < len(self.close):
+                reference[lookback - 1:] = self.close[:len(self.close) - lookback + 1]
+            reference = np.where(self.bars > lookback, reference, self.first_close)
+            return ((self.close - reference) / reference) * 100
+        return self._memoize(('momentum', lookback), compute)
+
+    def _compute_score(self, name, p):
+        close = self.close
+        if name == 'rsi':
+            return score_rsi(self.rsi(p['rsi_window']))
+        if name == 'moving_averages':
+            ma_short = self.rolling_mean(p['ma_short'])
+            ma_medium = self.rolling_mean(p['ma_medium'])
+            ma_long = np.where(self.bars >= p['ma_long'], self.rolling_mean(p['ma_long']), ma_medium)
+            return score_moving_averages(close, ma_short, ma_medium, ma_long)
+        if name == 'macd':
+            return score_macd(*self.macd(p['macd_fast'], p['macd_slow'], p['macd_signal']))
+        if name == 'bollinger_bands':
+            middle = self.rolling_mean(p['bb_window'])
+            band = self.rolling_std(p['bb_window']) * p['bb_k']
+            return score_bollinger((close - (middle - band)) / (2 * band))
+        return score_momentum(self.momentum(p['momentum_lookback']))
+
+    def score(self, name, params):
+        """一项评分的 (日期 × ticker) 整数矩阵, 按其依赖的参数缓存"""
+        key = (name,) + tuple(params[dep] for dep in SCORE_DEPENDENCIES[name])
+
+        def compute():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self._compute_score(name, params).astype(np.int8)
+        return self._memoize(key, compute)
+
+    def technical_scores(self, params):
+        """与 indicators.technical_score_history(close, params) 相同的技术总分"""
+        key = _technical_key(params)
+        if self._last_technical[0] == key:
+            return self._last_technical[1]
+
+        total = sum(self.score(name, params).astype(float) for name in TECHNICAL_INDICATORS)
+        total = np.round(total / len(TECHNICAL_INDICATORS), 2)
+        valid = ~np.isnan(self.close) & (self.bars >= MIN_BARS)
+        scores = pd.DataFrame(
+            np.where(valid, total, 0.0), index=self.close_frame.index, columns=self.close_frame.columns
+        )
+        # 按指标参数排序后, 相邻组合常常只有权重/阈值不同
+        self._last_technical = (key, scores)
+        return scores
+
+
+def evaluate(shared, params, fundamental_scores=None, backtest_options=None):
+    """回测一个参数组合, 返回参数与组合指标合并后的 dict"""
+    backtester = Backtester(
+        buy_threshold=params['buy_threshold'],
+        sell_threshold=params['sell_threshold'],
+        fundamental_weight=params['fundamental_weight'],
+        technical_weight=1 - params['fundamental_weight'],
+        **(backtest_options or {})
+    )
+    result = backtester.run(
+        shared.close_frame, fundamental_scores, technical_scores=shared.technical_scores(params),
+        ticker_metrics=False
+    )
+    return {**params, **result['portfolio']}
+
+
+_worker_state = None
+
+
+def _init_worker(close, fundamental_scores, backtest_options):
+    global _worker_state
+    _worker_state = (SharedIndicators(close), fundamental_scores, backtest_options)
+
+
+def _evaluate_chunk(chunk):
+    shared, fundamental_scores, backtest_options = _worker_state
+    return [evaluate(shared, params, fundamental_scores, backtest_options) for params in chunk]
+
+
+class ParameterOptimizer:
+    """在一个价格宽表上搜索最佳参数组合
+
+    close: 收盘价宽表 (日期 × ticker), 例如 fetch_universe(...)['prices']['Close'];
+    均线等长窗口需要足够长的历史。
+    fundamental_scores: {ticker: 基本面评分}, 可选 (见 Backtester.total_scores)
+    metric: Backtester 组合指标之一, 默认 'sharpe'
+    backtest_options: 传给 Backtester 的其它参数, 如 allow_short / cost_bps
+    """
+
+    def __init__(self, close, fundamental_scores=None, metric='sharpe', workers=None,
+                 backtest_options=None):
+        self.close = close
+        self.fundamental_scores = fundamental_scores
+        self.metric = metric
+        self.workers = workers or os.cpu_count() or 1
+        self.backtest_options = backtest_options or {}
+
+    def evaluate(self, combinations):
+        """回测全部组合, 返回按 metric 排序的 DataFrame (每行一个组合)"""
+        # 指标参数相同的组合相邻, 共享同一个工作进程中的缓存
+        combinations = sorted(combinations, key=_evaluation_order)
+        if not combinations:
+            return pd.DataFrame()
+
+        if self.workers == 1 or len(combinations) == 1:
+            shared = SharedIndicators(self.close)
+            rows = [
+                evaluate(shared, params, self.fundamental_scores, self.backtest_options)
+                for params in combinations
+            ]
+        else:
+            n_chunks = min(len(combinations), self.workers * 4)
+            size = -(-len(combinations) // n_chunks)
+            chunks = [combinations[i:i + size] for i in range(0, len(combinations), size)]
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker,
+                initargs=(self.close, self.fundamental_scores, self.backtest_options)
+            ) as executor:
+                rows = [row for chunk_rows in executor.map(_evaluate_chunk, chunks) for row in chunk_rows]
+
+        results = pd.DataFrame(rows)
+        return results.sort_values(
+            self.metric, ascending=self.metric in LOWER_IS_BETTER, na_position='last'
+        ).reset_index(drop=True)
+
+    def grid_search(self, grid=None, top=10):
+        """网格搜索, 返回最佳的 top 个组合"""
+        return self.evaluate(grid_combinations(grid or DEFAULT_GRID)).head(top)
+
+    def random_search(self, space=None, n_iter=100, seed=None, top=10):
+        """随机搜索 n_iter 个组合, 返回最佳的 top 个组合"""
+        return self.evaluate(random_combinations(space or DEFAULT_SPACE, n_iter, seed)).head(top)
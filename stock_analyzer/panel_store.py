@@ -0,0 +1,294 @@
+"""
+内存映射的价格面板存储
+
+多个 ticker 的 OHLCV 保存为一个 (日期 × ticker × 字段) 的 float64 数组:
+    <directory>/prices-<版本>.dat   原始数组, 按日期行优先排列, 新交易日追加在文件末尾
+    <directory>/dates-<版本>.npy    日期 (UTC 纳秒)
+    <directory>/meta.json           tickers / fields / 时区 / 行数, 以及当前版本的两个文件名
+读取时以 np.memmap 只读打开, 按日期区间或字段切片得到的都是视图, 不复制数据;
+多个进程同时打开同一个存储时共享操作系统的页缓存。
+
+    store = PanelStore()
+    store.append(analyzer.fetch_universe(tickers)['prices'])
+    close = store.field('Close', start='2015-01-01')   # 日期 × ticker, 内存映射视图
+    hist = store.history('AIR.PA')
+
+写入顺序为先数据、后 meta.json (原子替换), 读者只读取 meta.json 中记录的行数,
+所以追加过程中的读者不会看到不完整的行。整个重写 (新 ticker 等) 写入新版本的文件,
+最后才替换 meta.json, 读者总是得到一致的 meta 和数组形状; 旧版本的文件随后删除
+(Windows 上仍被映射的文件删除失败时保留, 下次重写时再清理)。同一个存储只应有一个写入者。
+"""
+
+import os
+import glob
+import json
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import PANEL_DIR
+
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+DTYPE = np.float64
+
+# 旧格式的 meta.json 没有记录文件名
+DEFAULT_FILES = {'data': "prices.dat", 'dates': "dates.npy"}
+
+
+class PanelStore:
+    """(日期 × ticker × 字段) 的价格面板, 以内存映射数组读取"""
+
+    def __init__(self, directory=PANEL_DIR, fields=FIELDS):
+        self.directory = directory
+        self.default_fields = list(fields)
+        self._meta = None
+        self._dates = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_atomic(self, path, write):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    # ---- 元数据 ----
+
+    def _file(self, meta, kind):
+        """meta 所指版本的数据文件 ('data') 或日期文件 ('dates') 的路径"""
+        return self._path(meta.get(kind, DEFAULT_FILES[kind]))
+
+    def _load_meta(self):
+        """读取 meta.json 和日期; 文件未变化时复用上次的结果"""
+        path = self._path("meta.json")
+        for _ in range(3):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+
+            version = (stat.st_mtime_ns, stat.st_size)
+            if version == self._version:
+                return self._meta
+            with open(path, encoding="utf-8") as f:
+                meta = json.load(f)
+            try:
+                dates = pd.to_datetime(np.load(self._file(meta, 'dates'))[:meta['rows']], utc=True)
+            except FileNotFoundError:
+                # 读取 meta.json 之后存储被整个重写, 旧版本的文件已删除: 重新读取
+                continue
+            self._dates = dates.tz_convert(meta['tz']) if meta['tz'] else dates.tz_localize(None)
+            self._meta, self._version = meta, version
+            return self._meta
+        raise RuntimeError(f"Stockage de prix en cours de réécriture: {self.directory}")
+
+    def exists(self):
+        return self._load_meta() is not None
+
+    @property
+    def tickers(self):
+        meta = self._load_meta()
+        return list(meta['tickers']) if meta else []
+
+    @property
+    def fields(self):
+        meta = self._load_meta()
+        return list(meta['fields']) if meta else list(self.default_fields)
+
+    @property
+    def dates(self):
+        return self._dates if self._load_meta() else pd.DatetimeIndex([])
+
+    def open(self):
+        """只读内存映射数组 (日期 × ticker × 字段); 存储不存在时返回 None"""
+        for _ in range(3):
+            meta = self._load_meta()
+            if meta is None:
+                return None
+            shape = (meta['rows'], len(meta['tickers']), len(meta['fields']))
+            if meta['rows'] == 0:
+                return np.empty(shape, dtype=DTYPE)
+            try:
+                return np.memmap(self._file(meta, 'data'), dtype=DTYPE, mode='r', shape=shape)
+            except FileNotFoundError:
+                self._version = None
+        raise RuntimeError(f"Stockage de prix en cours de réécriture: {self.directory}")
+
+    # ---- 读取 ----
+
+    def _timestamp(self, value):
+        """把日期参数转换为与存储相同时区的 Timestamp"""
+        timestamp = pd.Timestamp(value)
+        tz = self._meta['tz']
+        if tz and timestamp.tzinfo is None:
+            return timestamp.tz_localize(tz)
+        if not tz and timestamp.tzinfo is not None:
+            return timestamp.tz_convert(None)
+        return timestamp
+
+    def _rows(self, start=None, end=None):
+        """[start, end] 日期区间 (两端都包含) 对应的行切片"""
+        first = 0 if start is None else self._dates.searchsorted(self._timestamp(start), side='left')
+        last = len(self._dates) if end is None else \
+            self._dates.searchsorted(self._timestamp(end), side='right')
+        return slice(first, last)
+
+    def _columns(self, tickers):
+        """tickers 对应的列位置; 不在存储中的 ticker 被忽略"""
+        positions = {ticker: i for i, ticker in enumerate(self._meta['tickers'])}
+        if tickers is None:
+            return slice(None), list(self._meta['tickers'])
+        selected = [ticker for ticker in tickers if ticker in positions]
+        return [positions[ticker] for ticker in selected], selected
+
+    def field(self, name, tickers=None, start=None, end=None):
+        """一个字段的宽表 (日期 × ticker)
+
+        不指定 tickers 时为内存映射数组的视图 (不复制);
+        指定 tickers 时只复制 [start, end] 区间内这些列的数据。
+        """
+        array = self.open()
+        if array is None:
+            return pd.DataFrame()
+        rows = self._rows(start, end)
+        columns, selected = self._columns(tickers)
+        values = array[rows, :, self._meta['fields'].index(name)]
+        if not isinstance(columns, slice):
+            values = values[:, columns]
+        return pd.DataFrame(values, index=self._dates[rows], columns=selected, copy=False)
+
+    def panel(self, tickers=None, start=None, end=None, fields=None):
+        """与 fetch_universe 的 'prices' 相同格式的 DataFrame, 列为 (字段, ticker) 的 MultiIndex"""
+        if not self.exists():
+            return pd.DataFrame()
+        frames = {name: self.field(name, tickers, start, end) for name in (fields or self.fields)}
+        return pd.concat(frames, axis=1).sort_index(axis=1)
+
+    def history(self, ticker, start=None, end=None):
+        """一个 ticker 的 OHLCV (与 hist_data 相同的列), 去掉该 ticker 没有数据的日期"""
+        array = self.open()
+        if array is None or ticker not in self._meta['tickers']:
+            return pd.DataFrame(columns=self.fields)
+        rows = self._rows(start, end)
+        values = array[rows, self._meta['tickers'].index(ticker), :]
+        hist = pd.DataFrame(values, index=self._dates[rows], columns=self._meta['fields'], copy=False)
+        return hist.dropna(how='all')
+
+    # ---- 写入 ----
+
+    def _align_index(self, index, tz):
+        index = pd.DatetimeIndex(index)
+        if tz is None:
+            return index.tz_localize(None) if index.tz is None else index.tz_convert(None)
+        return index.tz_localize(tz) if index.tz is None else index.tz_convert(tz)
+
+    def _to_array(self, prices, tickers, fields):
+        """把 (字段, ticker) 列的 DataFrame 转换为 (日期 × ticker × 字段) 数组"""
+        array = np.full((len(prices), len(tickers), len(fields)), np.nan, dtype=DTYPE)
+        available = set(prices.columns.get_level_values(0))
+        for k, name in enumerate(fields):
+            if name in available:
+                array[:, :, k] = prices[name].reindex(columns=tickers).to_numpy(dtype=DTYPE)
+        return array
+
+    def _write_meta(self, tickers, fields, tz, dates, files):
+        """写入日期文件, 最后原子地替换 meta.json (files: 该版本的数据和日期文件名)"""
+        def write_dates(path):
+            with open(path, "wb") as f:
+                utc = dates.tz_convert('UTC') if dates.tz is not None else dates
+                np.save(f, utc.as_unit('ns').asi8)
+
+        def write_meta(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {'tickers': tickers, 'fields': fields, 'tz': tz, 'rows': len(dates), **files}, f,
+                    ensure_ascii=False
+                )
+
+        self._write_atomic(self._path(files['dates']), write_dates)
+        self._write_atomic(self._path("meta.json"), write_meta)
+        self._version = None
+
+    def _remove_old_versions(self, files):
+        """删除 files 以外的数据和日期文件; 仍被其它进程映射而无法删除的文件留待下次"""
+        for pattern in ("prices*.dat", "dates*.npy"):
+            for path in glob.glob(self._path(pattern)):
+                if os.path.basename(path) not in files.values():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def write(self, prices):
+        """用 prices (列为 (字段, ticker) 的 DataFrame) 重写整个存储"""
+        with self._lock:
+            self._write(prices)
+
+    def _write(self, prices):
+        os.makedirs(self.directory, exist_ok=True)
+        tz = str(prices.index.tz) if getattr(prices.index, 'tz', None) is not None else None
+        prices = prices.sort_index()
+        tickers = sorted(set(prices.columns.get_level_values(1)))
+        fields = [name for name in self.default_fields if name in set(prices.columns.get_level_values(0))]
+        array = self._to_array(prices, tickers, fields)
+
+        # 新版本的文件名: 正在读取旧版本的进程不受影响
+        version = time.time_ns()
+        files = {'data': f"prices-{version}.dat", 'dates': f"dates-{version}.npy"}
+        self._write_atomic(self._path(files['data']), lambda path: array.tofile(path))
+        self._write_meta(tickers, fields, tz, self._align_index(prices.index, tz), files)
+        self._remove_old_versions(files)
+
+    def append(self, prices):
+        """写入新的行情 (列为 (字段, ticker) 的 DataFrame, 如 fetch_universe 的 'prices')
+
+        - 已有日期: 原地覆盖 (prices 中为 NaN 的值保留原数据)
+        - 最后一个日期之后的新交易日: 追加到文件末尾
+        - 新 ticker 或早于最后日期的新日期: 合并后重写整个存储
+        """
+        if prices.empty:
+            return
+        with self._lock:
+            meta = self._load_meta()
+            if meta is None:
+                self._write(prices)
+                return
+
+            prices = prices.copy()
+            prices.index = self._align_index(prices.index, meta['tz'])
+            prices = prices[~prices.index.duplicated(keep='last')].sort_index()
+            dates = self._dates
+            new_dates = prices.index[~prices.index.isin(dates)]
+            new_tickers = set(prices.columns.get_level_values(1)) - set(meta['tickers'])
+            new_fields = set(prices.columns.get_level_values(0)) & \
+                (set(self.default_fields) - set(meta['fields']))
+
+            if new_tickers or new_fields or (len(dates) and len(new_dates) and new_dates[0] <= dates[-1]):
+                self._write(prices.combine_first(self.panel()))
+                return
+
+            tickers, fields = meta['tickers'], meta['fields']
+            files = {kind: meta.get(kind, name) for kind, name in DEFAULT_FILES.items()}
+            data_path = self._path(files['data'])
+            shape = (meta['rows'], len(tickers), len(fields))
+            updated = prices.loc[prices.index.isin(dates)]
+            if not updated.empty:
+                rows = dates.get_indexer(updated.index)
+                array = np.memmap(data_path, dtype=DTYPE, mode='r+', shape=shape)
+                incoming = self._to_array(updated, tickers, fields)
+                array[rows] = np.where(np.isnan(incoming), array[rows], incoming)
+                array.flush()
+                del array
+
+            if len(new_dates):
+                appended = self._to_array(prices.loc[new_dates], tickers, fields)
+                with open(data_path, "r+b") as f:
+                    # 丢弃上次中断的追加留下的、meta.json 未记录的数据
+                    f.truncate(int(np.prod(shape)) * np.dtype(DTYPE).itemsize)
+                    f.seek(0, os.SEEK_END)
+                    appended.tofile(f)
+                self._write_meta(tickers, fields, meta['tz'], dates.append(new_dates), files)
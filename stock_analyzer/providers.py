@@ -0,0 +1,195 @@
+"""
+行情数据源 (provider)
+
+StockAnalyzer 的所有下载都经过一个 provider, 它需要提供三个方法:
+    info(ticker)                               基本面数据 (与 yf.Ticker(ticker).info 相同的 dict)
+    history(ticker, interval, period=/start=/end=)   一个 ticker 的 OHLCV K线
+    download(tickers, interval, period=/start=/end=) 多个 ticker 的K线, 列为 (ticker, 字段)
+
+- YFinanceProvider: 从 Yahoo Finance 下载 (yfinance 在第一次下载时才导入)
+- ReplayProvider:   回放 record() 保存在本地目录中的K线和基本面快照, 不访问网络,
+                    结果可重复, 适合基准测试和压力测试
+
+    record(['AIR.PA', 'MC.PA'], 'fixtures/')           # 或: python providers.py AIR.PA MC.PA --dir fixtures
+    analyzer = StockAnalyzer(provider=ReplayProvider('fixtures/'))
+
+设置环境变量 STOCK_ANALYZER_REPLAY_DIR 时, 仪表盘和 batch.py 默认使用该目录的 ReplayProvider。
+回放时的缓存和结果使用 storage_dirs() 给出的专用目录, 不读写真实数据的缓存和结果。
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
+
+import pandas as pd
+
+from cache import period_to_offset
+from config import CACHE_DIR, HISTORY_INTERVAL, REPLAY_DIR, REPLAY_WORK_DIR, RESULTS_DIR, TIMEFRAMES
+
+# record() 默认保存的周期及其下载时长 (日线多保存一些, 供指标预热和回测使用)
+RECORD_PERIODS = {"1d": "2y", "5m": "60d", "1m": "7d"}
+
+
+def _file_name(ticker):
+    return ticker.replace("/", "_").replace("^", "_")
+
+
+class YFinanceProvider:
+    """Yahoo Finance 数据源"""
+
+    def info(self, ticker):
+        import yfinance as yf
+        return yf.Ticker(ticker).info
+
+    def history(self, ticker, interval=HISTORY_INTERVAL, **kwargs):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(interval=interval, **kwargs)
+
+    def download(self, tickers, interval=HISTORY_INTERVAL, **kwargs):
+        import yfinance as yf
+        return yf.download(
+            tickers, interval=interval, group_by='ticker', auto_adjust=True,
+            actions=True, threads=True, progress=False, ignore_tz=False, **kwargs
+        )
+
+
+class ReplayProvider:
+    """回放本地录制的数据
+
+    directory 中每个 ticker 有:
+        <ticker>.info.json          基本面快照
+        <ticker>_<interval>.parquet 该周期的 OHLCV K线
+    文件只读取一次并保存在内存中, 之后的请求不再读盘。
+    period 相对于录制的最后一根K线计算 (而不是当前时间), 所以回放结果与运行日期无关。
+    """
+
+    def __init__(self, directory=REPLAY_DIR):
+        self.directory = directory
+        self._frames = {}
+        self._infos = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _bars(self, ticker, interval):
+        key = (ticker, interval)
+        with self._lock:
+            if key not in self._frames:
+                path = self._path(f"{_file_name(ticker)}_{interval}.parquet")
+                self._frames[key] = pd.read_parquet(path) if os.path.exists(path) else None
+            return self._frames[key]
+
+    def _timestamp(self, value, index):
+        timestamp = pd.Timestamp(value)
+        if index.tz is not None and timestamp.tzinfo is None:
+            return timestamp.tz_localize(index.tz)
+        return timestamp
+
+    def info(self, ticker):
+        with self._lock:
+            if ticker not in self._infos:
+                path = self._path(f"{_file_name(ticker)}.info.json")
+                if not os.path.exists(path):
+                    raise ValueError(f"Aucune donnée enregistrée pour {ticker}")
+                with open(path, encoding="utf-8") as f:
+                    self._infos[ticker] = json.load(f)
+            return dict(self._infos[ticker])
+
+    def history(self, ticker, interval=HISTORY_INTERVAL, period=None, start=None, end=None, **kwargs):
+        """与 yf.Ticker.history 相同: start 包含在内, end 不包含; 没有数据时返回空 DataFrame"""
+        bars = self._bars(ticker, interval)
+        if bars is None or bars.empty:
+            return pd.DataFrame()
+
+        if start is not None:
+            bars = bars[bars.index >= self._timestamp(start, bars.index)]
+        elif period is not None and period_to_offset(period) is not None:
+            bars = bars[bars.index >= bars.index[-1] - period_to_offset(period)]
+        if end is not None:
+            bars = bars[bars.index < self._timestamp(end, bars.index)]
+        return bars
+
+    def download(self, tickers, interval=HISTORY_INTERVAL, **kwargs):
+        """与 yf.download(group_by='ticker') 相同格式: 列为 (ticker, 字段) 的 MultiIndex"""
+        frames = {ticker: self.history(ticker, interval, **kwargs) for ticker in tickers}
+        frames = {ticker: bars for ticker, bars in frames.items() if not bars.empty}
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1, sort=True)
+
+
+def default_provider():
+    """设置了 STOCK_ANALYZER_REPLAY_DIR 时回放该目录, 否则使用 Yahoo Finance"""
+    return ReplayProvider(REPLAY_DIR) if REPLAY_DIR else YFinanceProvider()
+
+
+def storage_dirs(replay_dir=REPLAY_DIR):
+    """(缓存目录, 结果目录)
+
+    不回放时为 CACHE_DIR 和 RESULTS_DIR; 回放时为 REPLAY_WORK_DIR 下该录制数据专用的目录,
+    目录名由录制目录的路径和其中文件的修改时间决定, 重新录制后自动使用新的空目录,
+    所以回放结果只取决于录制的数据。
+    """
+    if not replay_dir:
+        return CACHE_DIR, RESULTS_DIR
+
+    directory = os.path.abspath(replay_dir)
+    fingerprint = hashlib.sha1(directory.encode("utf-8"))
+    if os.path.isdir(directory):
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.is_file():
+                stat = entry.stat()
+                fingerprint.update(f"{entry.name}:{stat.st_mtime_ns}:{stat.st_size};".encode("utf-8"))
+    workdir = os.path.join(REPLAY_WORK_DIR, fingerprint.hexdigest()[:16])
+    return os.path.join(workdir, "cache"), os.path.join(workdir, "results")
+
+
+def record(tickers, directory, provider=None, periods=None):
+    """从 provider (默认 Yahoo Finance) 下载并保存 ReplayProvider 使用的数据
+
+    periods: {周期: 下载时长}, 默认 RECORD_PERIODS。返回 {ticker: 错误信息}。
+    """
+    provider = provider or YFinanceProvider()
+    periods = periods or RECORD_PERIODS
+    os.makedirs(directory, exist_ok=True)
+
+    errors = {}
+    for ticker in tickers:
+        try:
+            info = provider.info(ticker)
+            with open(os.path.join(directory, f"{_file_name(ticker)}.info.json"), "w", encoding="utf-8") as f:
+                json.dump(info, f, ensure_ascii=False, default=str)
+            for interval, period in periods.items():
+                bars = provider.history(ticker, interval=interval, period=period)
+                if not bars.empty:
+                    bars.to_parquet(os.path.join(directory, f"{_file_name(ticker)}_{interval}.parquet"))
+        except Exception as e:
+            errors[ticker] = str(e)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enregistrer des données de marché pour ReplayProvider")
+    parser.add_argument("tickers", nargs="+", help="Tickers à enregistrer")
+    parser.add_argument("--dir", required=True, help="Répertoire de destination")
+    parser.add_argument(
+        "--intervals", nargs="+", default=list(RECORD_PERIODS), help="Intervalles des bougies à enregistrer"
+    )
+    args = parser.parse_args(argv)
+
+    periods = {
+        interval: RECORD_PERIODS.get(interval, TIMEFRAMES[interval]['period']) for interval in args.intervals
+    }
+    errors = record(args.tickers, args.dir, periods=periods)
+    for ticker, error in errors.items():
+        print(f"  ⚠️ {ticker}: {error}")
+    print(f"Enregistré: {len(args.tickers) - len(errors)}/{len(args.tickers)} tickers -> {args.dir}")
+    return 0 if not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+K线重采样
+
+日内行情只下载并缓存最细的周期 (见 config.TIMEFRAMES 的 source), 更粗的周期在本地聚合得到,
+不需要为每个周期单独下载。
+"""
+
+# 各列的聚合方式; 不在其中的列被丢弃
+OHLCV_AGGREGATION = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum',
+    'Dividends': 'sum',
+    'Stock Splits': 'max',
+    'Capital Gains': 'sum'
+}
+
+
+def resample_ohlcv(bars, rule):
+    """把 OHLCV K线聚合为 rule (pandas 频率, 如 '15min'、'1h') 周期的K线
+
+    按时间向下取整分组 (K线时间为周期的开始时间), 没有成交的周期 (夜间、周末) 不产生K线。
+    """
+    if bars.empty or rule is None:
+        return bars
+
+    aggregation = {name: how for name, how in OHLCV_AGGREGATION.items() if name in bars.columns}
+    keys = bars.index.floor(rule)
+    resampled = bars.groupby(keys, sort=True).agg(aggregation)
+    resampled.index.name = bars.index.name
+    return resampled
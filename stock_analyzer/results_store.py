@@ -0,0 +1,85 @@
+"""
+预计算分析结果的本地存储
+"""
+
+import os
+import json
+import threading
+
+import pandas as pd
+
+from config import RESULTS_DIR
+
+# 这些字段是 DataFrame, 不写入 JSON
+FRAME_FIELDS = ['hist_data', 'indicator_series']
+
+
+def _to_json(value):
+    """numpy 标量等对象的 JSON 转换"""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class ResultsStore:
+    """每个 ticker 最新的分析结果: <ticker>.json 保存评分/指标/信号, <ticker>.parquet 保存指标序列"""
+
+    def __init__(self, directory=RESULTS_DIR):
+        self.directory = directory
+
+    def _path(self, ticker, extension):
+        safe_ticker = ticker.replace("/", "_").replace("^", "_")
+        return os.path.join(self.directory, f"{safe_ticker}.{extension}")
+
+    def _write_atomic(self, path, write):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def save(self, result):
+        """保存一个 run_analysis 结果 (不含 hist_data)"""
+        os.makedirs(self.directory, exist_ok=True)
+        ticker = result['ticker']
+
+        series = result.get('indicator_series')
+        if series is not None:
+            self._write_atomic(self._path(ticker, "parquet"), series.to_parquet)
+
+        payload = {key: value for key, value in result.items() if key not in FRAME_FIELDS}
+
+        def write_json(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, default=_to_json)
+
+        self._write_atomic(self._path(ticker, "json"), write_json)
+
+    def load(self, ticker, as_of=None, with_series=True):
+        """读取 ticker 的最新结果; 指定 as_of 时只返回数据时间戳相同的结果"""
+        path = self._path(ticker, "json")
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+        except Exception as e:
+            print(f"Résultat illisible {path}: {e}")
+            return None
+
+        if as_of is not None and (result.get('data_as_of'), result.get('fundamentals_as_of')) != tuple(as_of):
+            return None
+
+        if with_series:
+            series_path = self._path(ticker, "parquet")
+            result['indicator_series'] = pd.read_parquet(series_path) if os.path.exists(series_path) else None
+        return result
+
+    def tickers(self):
+        """已保存结果的全部 ticker"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def load_all(self):
+        """全部已保存的结果 (不含指标序列)"""
+        results = [self.load(ticker, with_series=False) for ticker in self.tickers()]
+        return [result for result in results if result is not None]
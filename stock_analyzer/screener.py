@@ -0,0 +1,116 @@
+"""
+股票筛选器: 对整个股票池计算评分并按总分排名
+"""
+
+import os
+
+import pandas as pd
+
+from cache import period_to_offset
+from config import COMPANIES, UNIVERSE_DIR, UNIVERSES, HISTORY_PERIOD
+from indicators import MIN_BARS, TECHNICAL_INDICATORS, technical_score_table, required_bars
+
+PROJECT_UNIVERSE = "Entreprises du projet"
+
+
+def load_universe(path):
+    """读取股票池 CSV 文件 (列为 ticker,name), 返回 {ticker: name}"""
+    if not os.path.isabs(path):
+        path = os.path.join(UNIVERSE_DIR, path)
+    universe = pd.read_csv(path, dtype=str).dropna(subset=['ticker'])
+    names = universe['name'] if 'name' in universe.columns else universe['ticker']
+    return dict(zip(universe['ticker'].str.strip(), names.fillna(universe['ticker'])))
+
+
+def available_universes():
+    """所有可选股票池的名称, 项目的5家公司排在第一位"""
+    return [PROJECT_UNIVERSE] + list(UNIVERSES.keys())
+
+
+def get_universe(name):
+    """按名称返回股票池 {ticker: name}"""
+    if name == PROJECT_UNIVERSE:
+        return {info['ticker']: company for company, info in COMPANIES.items()}
+    return load_universe(UNIVERSES[name])
+
+
+class Screener:
+    """在批量下载的数据上一次性计算全部 ticker 的基本面/技术面评分"""
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+
+    def run(self, universe, force_refresh=False, as_of=None):
+        """universe 为 {ticker: name} 或 ticker 列表
+
+        as_of: 按该日期的收盘价排名 (需要 analyzer 设置 panel_store, 从价格面板中切片读取;
+        基本面评分仍使用当前数据)
+        返回 {'table': 按 total_score 降序排列的 DataFrame, 'errors': {ticker: 错误信息}}
+        没有价格或K线不足 MIN_BARS 的 ticker 不参与排名, 在 errors 中说明原因。
+        """
+        if not isinstance(universe, dict):
+            universe = {ticker: ticker for ticker in universe}
+        tickers = list(universe)
+
+        data = self.analyzer.fetch_universe(tickers, force_refresh=force_refresh)
+        errors = dict(data['errors'])
+        prices = data['prices']
+        if prices.empty:
+            return {'table': pd.DataFrame(), 'errors': errors}
+
+        close = prices['Close'] if as_of is None else self._close_as_of(tickers, as_of)
+        technical = technical_score_table(close, self.analyzer.technical_params)
+
+        rows = []
+        for ticker in tickers:
+            info = data['info'].get(ticker)
+            if ticker not in technical.index or info is None:
+                errors.setdefault(ticker, "Données incomplètes")
+                continue
+            if not technical.loc[ticker, 'valid']:
+                errors.setdefault(ticker, self._invalid_reason(int(technical.loc[ticker, 'bars'])))
+                continue
+
+            fundamental = self.analyzer.calculate_fundamental_analysis(info)
+            fundamental_score = fundamental['total_score']
+            technical_score = float(technical.loc[ticker, 'technical_score'])
+            recommendation, _ = self.analyzer.get_recommendation(fundamental_score, technical_score)
+            last_close = close[ticker].dropna()
+
+            rows.append({
+                'ticker': ticker,
+                'name': universe[ticker],
+                'price': round(float(last_close.iloc[-1]), 2) if not last_close.empty else None,
+                'total_score': self.analyzer.combine_scores(fundamental_score, technical_score),
+                'fundamental_score': fundamental_score,
+                'technical_score': technical_score,
+                'recommendation': recommendation,
+                **{name: int(technical.loc[ticker, name]) for name in TECHNICAL_INDICATORS},
+                **fundamental['detailed_scores']
+            })
+
+        table = pd.DataFrame(rows)
+        if not table.empty:
+            table = table.sort_values('total_score', ascending=False).reset_index(drop=True)
+        return {'table': table, 'errors': errors}
+
+    @staticmethod
+    def _invalid_reason(bars):
+        """技术评分无效的 ticker 的错误信息"""
+        if bars == 0:
+            return "Aucun cours disponible"
+        return f"Historique insuffisant ({bars} barres, minimum {MIN_BARS})"
+
+    def _close_as_of(self, tickers, as_of):
+        """价格面板中截至 as_of 的收盘价: HISTORY_PERIOD 的长度, 且至少有指标预热需要的K线数"""
+        panel_store = self.analyzer.panel_store
+        if panel_store is None:
+            raise ValueError("Le classement à une date passée nécessite un PanelStore")
+        end = pd.Timestamp(as_of)
+        start = end - period_to_offset(HISTORY_PERIOD)
+        dates = panel_store.field('Close', end=end).index
+        if len(dates):
+            if dates.tz is not None and start.tzinfo is None:
+                start = start.tz_localize(dates.tz)
+            start = min(start, dates[max(len(dates) - required_bars(self.analyzer.technical_params), 0)])
+        return panel_store.field('Close', tickers, start=start, end=end)
@@ -0,0 +1,295 @@
+"""
+增量 (流式) 技术指标
+
+先用历史K线初始化, 之后每根新K线或每个新报价只需 O(1) 更新,
+评分与 calculate_technical_indicators 一致, 适合实时刷新的仪表盘。
+
+    state = IncrementalTechnicalState.from_history(hist_data)
+    state.result(price=last_tick)   # 盘中报价: 不改变状态
+    state.push(close_price)         # K线收盘: 写入状态
+"""
+
+import math
+from collections import deque
+
+import numpy as np
+
+from indicators import (
+    MIN_BARS, build_technical_result, empty_technical_result, resolve_params, score_arrays
+)
+
+
+class RollingStats:
+    """滚动窗口的均值和样本标准差
+
+    以第一个值为基准保存偏移后的和与平方和, 减小浮点抵消误差;
+    每隔若干次更新按窗口内的原始值重新求和, 避免误差累积。
+    """
+
+    RESYNC_EVERY = 1000
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self._shift = None
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._pushes = 0
+
+    def push(self, x):
+        if self._shift is None:
+            self._shift = x
+        d = x - self._shift
+        self.values.append(x)
+        self._sum += d
+        self._sumsq += d * d
+        if len(self.values) > self.window:
+            old = self.values.popleft() - self._shift
+            self._sum -= old
+            self._sumsq -= old * old
+
+        self._pushes += 1
+        if self._pushes % self.RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        self._shift = self.values[-1]
+        deviations = [v - self._shift for v in self.values]
+        self._sum = math.fsum(deviations)
+        self._sumsq = math.fsum(d * d for d in deviations)
+
+    def _moments(self, pending=None):
+        n, total, total_sq = len(self.values), self._sum, self._sumsq
+        shift = self._shift
+        if pending is not None:
+            if shift is None:
+                shift = pending
+            d = pending - shift
+            total += d
+            total_sq += d * d
+            n += 1
+            if n > self.window:
+                old = self.values[0] - shift
+                total -= old
+                total_sq -= old * old
+                n -= 1
+        return n, total, total_sq, shift
+
+    def mean(self, pending=None):
+        """窗口已满时的均值, 否则为 NaN; pending 为尚未收盘的最新价格"""
+        n, total, _, shift = self._moments(pending)
+        if n < self.window:
+            return math.nan
+        return shift + total / n
+
+    def std(self, pending=None):
+        """窗口已满时的样本标准差 (ddof=1), 否则为 NaN"""
+        n, total, total_sq, _ = self._moments(pending)
+        if n < self.window or n < 2:
+            return math.nan
+        return math.sqrt(max(total_sq - total * total / n, 0.0) / (n - 1))
+
+
+class EMA:
+    """指数移动平均 (与 pandas ewm(span, adjust=False) 相同, 以第一个值为起点)"""
+
+    def __init__(self, span=None, alpha=None):
+        self.alpha = alpha if alpha is not None else 2 / (span + 1)
+        self.value = None
+
+    def peek(self, x):
+        if self.value is None:
+            return x
+        return (1 - self.alpha) * self.value + self.alpha * x
+
+    def push(self, x):
+        self.value = self.peek(x)
+
+
+class RSI:
+    """RSI: method='sma' 为简单移动平均 (与 calculate_technical_indicators 相同), 'wilder' 为 Wilder 平滑"""
+
+    def __init__(self, window=14, method='sma'):
+        self.method = method
+        self.prev_close = None
+        if method == 'sma':
+            self.gains = RollingStats(window)
+            self.losses = RollingStats(window)
+        elif method == 'wilder':
+            self.gains = EMA(alpha=1 / window)
+            self.losses = EMA(alpha=1 / window)
+        else:
+            raise ValueError(f"Méthode RSI inconnue: {method}")
+
+    def _changes(self, price):
+        # 第一根K线没有涨跌, 计为 0 (与 pandas 的 delta.where(...) 结果一致)
+        if self.prev_close is None:
+            return 0.0, 0.0
+        delta = price - self.prev_close
+        return max(delta, 0.0), max(-delta, 0.0)
+
+    def value(self, pending=None):
+        if pending is None:
+            if self.method == 'sma':
+                gain, loss = self.gains.mean(), self.losses.mean()
+            else:
+                gain, loss = self.gains.value, self.losses.value
+        else:
+            g, l = self._changes(pending)
+            if self.method == 'sma':
+                gain, loss = self.gains.mean(g), self.losses.mean(l)
+            else:
+                gain, loss = self.gains.peek(g), self.losses.peek(l)
+
+        if gain is None or loss is None or math.isnan(gain) or math.isnan(loss):
+            return math.nan
+        if loss == 0:
+            return math.nan if gain == 0 else 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+    def push(self, price):
+        g, l = self._changes(price)
+        self.gains.push(g)
+        self.losses.push(l)
+        self.prev_close = price
+
+
+class MACD:
+    """MACD (EMA12 - EMA26) 及其 EMA9 信号线"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def values(self, pending=None):
+        if pending is None:
+            if self.fast.value is None:
+                return math.nan, math.nan, math.nan
+            line = self.fast.value - self.slow.value
+            signal = self.signal.value
+        else:
+            line = self.fast.peek(pending) - self.slow.peek(pending)
+            signal = self.signal.peek(line)
+        return line, signal, line - signal
+
+    def push(self, price):
+        self.fast.push(price)
+        self.slow.push(price)
+        self.signal.push(self.fast.value - self.slow.value)
+
+
+class Momentum:
+    """lookback 根K线前的价格变化百分比, 历史不足时与第一根K线比较"""
+
+    def __init__(self, lookback=21):
+        self.lookback = lookback
+        self.closes = deque(maxlen=lookback + 1)
+        self.first = None
+        self.count = 0
+
+    def value(self, pending=None):
+        closes, count = self.closes, self.count
+        if pending is not None:
+            closes = list(closes) + [pending]
+            count += 1
+        if count == 0:
+            return math.nan
+        current = closes[-1]
+        reference = closes[-self.lookback - 1] if count > self.lookback + 1 else \
+            (self.first if self.first is not None else current)
+        return ((current - reference) / reference) * 100
+
+    def push(self, price):
+        if self.first is None:
+            self.first = price
+        self.closes.append(price)
+        self.count += 1
+
+
+class IncrementalTechnicalState:
+    """一个 ticker 的全部技术指标状态, 每根K线/每个报价 O(1) 更新"""
+
+    def __init__(self, rsi_method='sma', params=None):
+        self.params = resolve_params(params)
+        p = self.params
+        self.rsi = RSI(p['rsi_window'], method=rsi_method)
+        self.ma_20 = RollingStats(p['ma_short'])
+        self.ma_50 = RollingStats(p['ma_medium'])
+        self.ma_200 = RollingStats(p['ma_long'])
+        self.bb = self.ma_20 if p['bb_window'] == p['ma_short'] else RollingStats(p['bb_window'])
+        self.macd = MACD(p['macd_fast'], p['macd_slow'], p['macd_signal'])
+        self.momentum = Momentum(p['momentum_lookback'] - 1)
+        self.bars = 0
+        self.last_close = None
+
+    @classmethod
+    def from_history(cls, hist_data, **kwargs):
+        """用历史K线 (含 'Close' 列的 DataFrame) 初始化"""
+        state = cls(**kwargs)
+        for price in hist_data['Close'].dropna().to_numpy(dtype=float):
+            state.push(price)
+        return state
+
+    def push(self, price):
+        """写入一根已收盘的K线"""
+        price = float(price)
+        self.rsi.push(price)
+        self.ma_20.push(price)
+        self.ma_50.push(price)
+        self.ma_200.push(price)
+        if self.bb is not self.ma_20:
+            self.bb.push(price)
+        self.macd.push(price)
+        self.momentum.push(price)
+        self.bars += 1
+        self.last_close = price
+
+    def values(self, price=None):
+        """当前各指标的值; price 为尚未收盘的最新报价时, 按它作为最后一根K线计算, 不改变状态"""
+        price = None if price is None else float(price)
+        close = self.last_close if price is None else price
+        bars = self.bars + (price is not None)
+
+        ma_20 = self.ma_20.mean(price)
+        ma_50 = self.ma_50.mean(price)
+        ma_200 = self.ma_200.mean(price) if bars >= self.params['ma_long'] else ma_50
+        macd_line, macd_signal, macd_histogram = self.macd.values(price)
+
+        bb_k = self.params['bb_k']
+        bb_middle = self.bb.mean(price)
+        bb_std = self.bb.std(price)
+        bb_upper = bb_middle + (bb_std * bb_k)
+        bb_lower = bb_middle - (bb_std * bb_k)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bb_position = np.float64(close - bb_lower) / np.float64(bb_upper - bb_lower)
+            bb_width = np.float64(bb_upper - bb_lower) / np.float64(bb_middle) * 100
+
+        return {
+            'close': close,
+            'bars': bars,
+            'rsi': self.rsi.value(price),
+            'ma_20': ma_20,
+            'ma_50': ma_50,
+            'ma_200': ma_200,
+            'macd_line': macd_line,
+            'macd_signal': macd_signal,
+            'macd_histogram': macd_histogram,
+            'bb_upper': bb_upper,
+            'bb_lower': bb_lower,
+            'bb_middle': bb_middle,
+            'bb_position': bb_position,
+            'bb_width': bb_width,
+            'price_change': self.momentum.value(price)
+        }
+
+    def result(self, price=None):
+        """与 calculate_technical_indicators 相同结构的技术分析结果"""
+        values = self.values(price)
+        if values['close'] is None or values['bars'] < MIN_BARS:
+            return empty_technical_result()
+
+        arrays = {name: np.array([value], dtype=float) for name, value in values.items()}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = score_arrays(arrays)
+        return build_technical_result(arrays, scores, 0)
@@ -0,0 +1,14 @@
+"""
+测试配置: 模块以扁平方式导入 (from config import ...), 缓存和结果写入临时目录
+"""
+
+import os
+import sys
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="stock-analyzer-tests-")
+os.environ.setdefault("STOCK_ANALYZER_CACHE_DIR", os.path.join(_WORKDIR, "cache"))
+os.environ.setdefault("STOCK_ANALYZER_RESULTS_DIR", os.path.join(_WORKDIR, "results"))
+os.environ.pop("STOCK_ANALYZER_REPLAY_DIR", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,50 @@
+"""
+StockAnalyzer._provider_call: 时限从调用开始执行时算起, 不包括在线程池中排队的时间
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import analyzer as analyzer_module
+from analyzer import StockAnalyzer
+
+
+class SlowProvider:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def info(self, ticker):
+        time.sleep(self.delay)
+        return {'symbol': ticker}
+
+
+@pytest.fixture
+def small_pool():
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_queued_calls_do_not_time_out(monkeypatch, small_pool):
+    monkeypatch.setitem(analyzer_module.PROVIDER_TIMEOUTS, 'info', 0.5)
+    analyzer = StockAnalyzer(provider=SlowProvider(0.2))
+    analyzer._calls = small_pool
+
+    tickers = [f"T{i}" for i in range(8)]
+    with ThreadPoolExecutor(max_workers=len(tickers)) as callers:
+        results = list(callers.map(lambda ticker: analyzer._provider_call('info', ticker), tickers))
+
+    assert results == [{'symbol': ticker} for ticker in tickers]
+
+
+def test_slow_call_still_times_out(monkeypatch, small_pool):
+    monkeypatch.setitem(analyzer_module.PROVIDER_TIMEOUTS, 'info', 0.2)
+    analyzer = StockAnalyzer(provider=SlowProvider(0.6))
+    analyzer._calls = small_pool
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        analyzer._provider_call('info', "AIR.PA")
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,80 @@
+"""
+HistoryCache: 早于 period 窗口的旧缓存
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache import HistoryCache, period_to_offset
+
+
+def _bars(index):
+    close = 100 + np.arange(len(index), dtype=float)
+    return pd.DataFrame(
+        {'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close, 'Volume': 1000.0}, index=index
+    )
+
+
+class FakeSource:
+    """按 period / start / end 返回 bars 的一段, 并记录每次请求"""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.calls = []
+
+    def __call__(self, period=None, start=None, end=None):
+        self.calls.append({'period': period, 'start': start, 'end': end})
+        bars = self.bars
+        tz = bars.index.tz
+        if start is not None:
+            bars = bars[bars.index >= pd.Timestamp(start).tz_localize(tz)]
+        elif period is not None:
+            bars = bars[bars.index >= pd.Timestamp.now(tz=tz) - period_to_offset(period)]
+        if end is not None:
+            bars = bars[bars.index < pd.Timestamp(end).tz_localize(tz)]
+        return bars
+
+
+def _age_file(cache, ticker, interval, seconds):
+    path = cache._path(ticker, interval)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_daily_cache_older_than_window_resumes_without_gap(tmp_path):
+    now = pd.Timestamp.now(tz="Europe/Paris").normalize()
+    source = FakeSource(_bars(pd.bdate_range(end=now, periods=600, tz="Europe/Paris")))
+
+    cache = HistoryCache(str(tmp_path))
+    stale = source.bars[source.bars.index < now - pd.DateOffset(months=8)]
+    cache.save("AIR.PA", "1d", stale)
+    _age_file(cache, "AIR.PA", "1d", 10 * 24 * 3600)
+
+    data = cache.get_history("AIR.PA", source, interval="1d", period="6mo", min_bars=200)
+
+    assert source.calls[0]['start'] == stale.index[-1].strftime("%Y-%m-%d")
+    full = cache.load("AIR.PA", "1d")
+    assert full.index.equals(source.bars.index)
+    assert data.index.equals(source.bars.index[-len(data):])
+    assert len(data) >= 200
+
+
+def test_intraday_cache_older_than_window_is_discarded(tmp_path):
+    now = pd.Timestamp.now(tz="Europe/Paris").floor("5min")
+    source = FakeSource(_bars(pd.date_range(end=now, periods=60 * 24 * 12, freq="5min", tz="Europe/Paris")))
+
+    cache = HistoryCache(str(tmp_path))
+    stale = _bars(pd.date_range(end=now - pd.Timedelta(days=120), periods=500, freq="5min", tz="Europe/Paris"))
+    cache.save("AIR.PA", "5m", stale)
+    _age_file(cache, "AIR.PA", "5m", 10 * 24 * 3600)
+
+    data = cache.get_history("AIR.PA", source, interval="5m", period="30d")
+
+    assert source.calls[0]['period'] == "30d"
+    full = cache.load("AIR.PA", "5m")
+    assert full.index[0] >= now - pd.Timedelta(days=30)
+    assert not full.index.isin(stale.index).any()
+    assert data.index.equals(full.index)
@@ -0,0 +1,71 @@
+"""
+向量化引擎: 宽表中某个 ticker 缺少交易日时, 结果与逐个 ticker 单独计算一致
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from analyzer import StockAnalyzer
+from indicators import MIN_BARS, TECHNICAL_INDICATORS, latest_technical_results, technical_score_table
+
+
+def _panel(sessions=260, seed=7):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end="2024-06-28", periods=sessions, tz="Europe/Paris")
+    returns = rng.normal(0.0005, 0.02, size=(sessions, 4))
+    close = pd.DataFrame(
+        100 * np.exp(np.cumsum(returns, axis=0)), index=index, columns=["AIR.PA", "MC.PA", "OR.PA", "SAN.PA"]
+    )
+    close.iloc[:120, 3] = np.nan  # 上市较晚
+    return close
+
+
+def _per_ticker(analyzer, close, ticker):
+    own = close[ticker].dropna()
+    return analyzer.calculate_technical_indicators(pd.DataFrame({'Close': own}))
+
+
+def _assert_same(panel_result, own_result):
+    assert panel_result['total_score'] == own_result['total_score']
+    assert panel_result['detailed_scores'] == own_result['detailed_scores']
+    assert panel_result['signals'] == own_result['signals']
+    for name, value in own_result['metrics'].items():
+        assert panel_result['metrics'][name] == pytest.approx(value, nan_ok=True), name
+
+
+@pytest.mark.parametrize("missing", [-10, -1], ids=["session-10-bars-back", "last-session"])
+def test_panel_with_missing_session_matches_per_ticker(missing):
+    analyzer = StockAnalyzer(provider=object())
+    close = _panel()
+    close.iloc[missing, 1] = np.nan
+
+    results = latest_technical_results(close, with_series=True, params=analyzer.technical_params)
+    table = technical_score_table(close, analyzer.technical_params)
+
+    for ticker in close.columns:
+        own = _per_ticker(analyzer, close, ticker)
+        _assert_same(results[ticker], own)
+        assert table.loc[ticker, 'valid']
+        assert table.loc[ticker, 'technical_score'] == own['total_score']
+        for name in TECHNICAL_INDICATORS:
+            assert table.loc[ticker, name] == own['detailed_scores'][name]
+
+    series = results["MC.PA"]['series']
+    assert series.index.equals(close.index)
+    assert np.isnan(series['close'].iloc[missing])
+
+
+def test_short_or_empty_tickers_are_marked_invalid():
+    close = _panel()
+    close.iloc[:-(MIN_BARS - 1), 2] = np.nan
+    close["VIE.PA"] = np.nan
+
+    table = technical_score_table(close)
+
+    assert table.loc["OR.PA", 'bars'] == MIN_BARS - 1
+    assert not table.loc["OR.PA", 'valid']
+    assert table.loc["VIE.PA", 'bars'] == 0
+    assert not table.loc["VIE.PA", 'valid']
+    assert (table.loc[["OR.PA", "VIE.PA"], 'technical_score'] == 0).all()
+    assert table.loc[["AIR.PA", "MC.PA", "SAN.PA"], 'valid'].all()
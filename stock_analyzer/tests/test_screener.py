@@ -0,0 +1,37 @@
+"""
+Screener: ticker 技术评分无效时不参与排名, 在 errors 中报告
+"""
+
+import numpy as np
+import pandas as pd
+
+from analyzer import StockAnalyzer
+from indicators import MIN_BARS
+from screener import Screener
+
+INFO = {'trailingPE': 14, 'priceToBook': 1.5, 'returnOnEquity': 0.15, 'debtToEquity': 60, 'dividendYield': 0.03}
+
+
+def _universe_data(close):
+    prices = pd.concat({'Close': close}, axis=1)
+    return {'prices': prices, 'info': {ticker: dict(INFO) for ticker in close.columns}, 'errors': {}}
+
+
+def test_short_and_empty_tickers_are_reported_not_ranked():
+    index = pd.bdate_range(end="2024-06-28", periods=260, tz="Europe/Paris")
+    rng = np.random.default_rng(3)
+    close = pd.DataFrame(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(len(index), 3)), axis=0)),
+        index=index, columns=["AIR.PA", "MC.PA", "OR.PA"]
+    )
+    close.iloc[:-(MIN_BARS - 1), 1] = np.nan
+    close.iloc[:, 2] = np.nan
+
+    analyzer = StockAnalyzer(provider=object())
+    analyzer.fetch_universe = lambda tickers, force_refresh=False: _universe_data(close)
+
+    result = Screener(analyzer).run(list(close.columns))
+
+    assert list(result['table']['ticker']) == ["AIR.PA"]
+    assert result['errors']["MC.PA"] == f"Historique insuffisant ({MIN_BARS - 1} barres, minimum {MIN_BARS})"
+    assert result['errors']["OR.PA"] == "Aucun cours disponible"
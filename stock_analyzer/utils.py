@@ -14,7 +14,28 @@ def setup_page_config():
         initial_sidebar_state="expanded"
     )
 
-def create_sidebar(companies, team_members):
+def create_mode_selector():
+    """选择单个公司分析或筛选器模式"""
+    return st.sidebar.radio(
+        "Mode:",
+        ["Analyse individuelle", "Screener"],
+        horizontal=True
+    )
+
+def create_debug_toggle():
+    """侧边栏的调试开关: 显示本次渲染各阶段的耗时"""
+    return st.sidebar.checkbox("🐞 Temps par étape (debug)", key="debug_timings")
+
+def create_screener_sidebar(universe_names):
+    """筛选器模式的侧边栏"""
+    st.sidebar.title("🔎 Screener")
+    universe_name = st.sidebar.selectbox("Univers d'actions:", universe_names)
+    run_btn = st.sidebar.button("🚀 Lancer le Screener", type="primary")
+    refresh_btn = st.sidebar.button("🔄 Actualiser les données")
+    
+    return universe_name, run_btn, refresh_btn
+
+def create_sidebar(companies, team_members, timeframes):
     """创建侧边栏"""
     st.sidebar.title("🏢 Sélection d'Entreprise")
     
@@ -32,9 +53,17 @@ def create_sidebar(companies, team_members):
         index=2
     )
     
+    # K线周期
+    interval = st.sidebar.selectbox(
+        "Unité de temps:",
+        list(timeframes.keys()),
+        format_func=lambda interval: f"{timeframes[interval]['name']} ({timeframes[interval]['span']})"
+    )
+    
     analyze_btn = st.sidebar.button("🚀 Lancer l'Analyse", type="primary")
+    refresh_btn = st.sidebar.button("🔄 Actualiser les données")
     
-    return selected_company, analyze_btn
+    return selected_company, interval, analyze_btn, refresh_btn
 
 def format_currency(value):
     """格式化货币显示"""
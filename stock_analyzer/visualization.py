@@ -1,29 +1,157 @@
 """
 可视化组件
+
+plotly 只在第一次绘图时导入, 欢迎页面不需要加载它。
+display_* / create_* 方法和 st.plotly_chart 的耗时记录在当前的 instrumentation.trace 中。
 """
 
+import threading
+
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
 
-from config import TECHNICAL_EXPLANATIONS, FUNDAMENTAL_EXPLANATIONS
+from instrumentation import span, timed
+
+from config import (
+    TECHNICAL_EXPLANATIONS, FUNDAMENTAL_EXPLANATIONS, FIGURE_CACHE_MAX_ENTRIES, CHART_WIDTH_PX,
+    CHART_DOWNSAMPLING, CHART_WEBGL_THRESHOLD, HISTORY_INTERVAL, TIMEFRAMES
+)
+
+def recommendation_color(recommendation):
+    """建议对应的颜色"""
+    return "green" if "ACHAT" in recommendation else \
+           "orange" if "SURVEILLER" in recommendation else \
+           "yellow" if "NE RIEN FAIRE" in recommendation else "red"
 
 class Visualizer:
     def __init__(self):
         self.technical_explanations = TECHNICAL_EXPLANATIONS
         self.fundamental_explanations = FUNDAMENTAL_EXPLANATIONS
+        self._figures = None
+        self._figures_lock = threading.Lock()
+
+    def cached_figure(self, key, build):
+        """按键缓存图表对象, 重新渲染时直接复用, 不再重新构建
+
+        Visualizer 由 st.cache_resource 创建, 缓存在所有会话间共享, 按 LRU 限制条目数。
+        """
+        with self._figures_lock:
+            if self._figures is None:
+                # 延迟导入: cache 模块依赖 pandas
+                from cache import ResultCache
+                self._figures = ResultCache(FIGURE_CACHE_MAX_ENTRIES)
+        
+        figure = self._figures.get(key)
+        if figure is None:
+            figure = build()
+            if figure is not None:
+                self._figures.put(key, figure)
+        return figure
+
+    def _price_chart(self, result, date_range=None, width_px=CHART_WIDTH_PX):
+        """分析结果的价格曲线图
+
+        缓存键为行情和指标序列的内容哈希, 加上显示的日期区间和图表宽度 (两者决定降采样的结果)。
+        """
+        from cache import content_hash
+        
+        series = result.get('indicator_series')
+        interval = result.get('interval', HISTORY_INTERVAL)
+        timeframe = TIMEFRAMES[interval]
+        period_label = timeframe['span'] if interval == HISTORY_INTERVAL else \
+            f"{timeframe['name']}, {timeframe['span']}"
+        key = ('price', content_hash(
+            result['hist_data'], series[['ma_20', 'ma_50']] if series is not None else None,
+            result['company_name'], result['color']
+        ), period_label, date_range, width_px)
+        return self.cached_figure(key, lambda: self.create_price_chart(
+            result['hist_data'], result['company_name'], result['color'], series,
+            date_range=date_range, width_px=width_px, period_label=period_label
+        ))
+
+    def _price_range(self, result, width_px=CHART_WIDTH_PX):
+        """行情点数超过图表宽度时显示日期区间滑块, 返回选中的 (开始, 结束); 否则返回 None
+
+        plotly 的缩放只在浏览器中进行, 服务器收不到缩放事件; 通过滑块缩小区间后,
+        服务器对该区间重新降采样, 显示更多细节。
+        """
+        hist_data = result['hist_data']
+        if len(hist_data) <= width_px:
+            return None
+        
+        index = hist_data.index.tz_localize(None) if hist_data.index.tz is not None else hist_data.index
+        first, last = index[0].to_pydatetime(), index[-1].to_pydatetime()
+        start, end = st.slider(
+            "🔍 Période affichée",
+            min_value=first,
+            max_value=last,
+            value=(first, last),
+            format="DD/MM/YYYY",
+            key=f"price_range_{result['ticker']}_{result.get('interval', HISTORY_INTERVAL)}"
+        )
+        shown = ((index >= start) & (index <= end)).sum()
+        if shown > width_px:
+            st.caption(f"{shown} points sur la période, affichés en {width_px} points. Réduisez la période pour plus de détails.")
+        return (start, end) if (start, end) != (first, last) else None
+
+    def _plotly_chart(self, figure, **kwargs):
+        """st.plotly_chart, 耗时 (图表序列化并发送到浏览器) 记为 plotly_chart 阶段"""
+        with span("plotly_chart"):
+            st.plotly_chart(figure, **kwargs)
+
+    def _score_gauge(self, score, title, color):
+        return self.cached_figure(
+            ('gauge', score, title, color), lambda: self.create_score_gauge(score, title, color)
+        )
 
-    def create_price_chart(self, hist_data, company_name, color):
-        """创建价格曲线图"""
+    @timed()
+    def create_price_chart(self, hist_data, company_name, color, indicator_series=None,
+                           date_range=None, width_px=CHART_WIDTH_PX, period_label="6 mois"):
+        """创建价格曲线图
+
+        indicator_series 为分析结果中的指标序列, 提供时直接使用其中的 MA20/MA50。
+        period_label 为标题中显示的周期 (如 "6 mois", "1 heure, 60 jours")。
+        date_range 为显示的 (开始, 结束) 日期 (不含时区), 为 None 时显示全部行情;
+        区间内的点数超过 width_px 时降采样到约 width_px 个点。
+        """
         if hist_data.empty:
             return None
-            
+        
+        import plotly.graph_objects as go
+        from downsampling import downsample_indices
+        
+        # 移动平均线在完整行情上计算, 再与收盘价一起截取和降采样
+        if indicator_series is None:
+            indicator_series = {
+                'ma_20': hist_data['Close'].rolling(window=20).mean(),
+                'ma_50': hist_data['Close'].rolling(window=50).mean()
+            }
+        has_ma_20, has_ma_50 = len(hist_data) >= 20, len(hist_data) >= 50
+        
+        mask = hist_data['Close'].notna().to_numpy()
+        title_period = period_label
+        if date_range is not None:
+            index = hist_data.index.tz_localize(None) if hist_data.index.tz is not None else hist_data.index
+            mask = mask & (index >= date_range[0]) & (index <= date_range[1])
+            title_period = f"{date_range[0]:%d/%m/%Y} - {date_range[1]:%d/%m/%Y}"
+        
+        dates = hist_data.index[mask]
+        close = hist_data['Close'].to_numpy()[mask]
+        positions = downsample_indices(dates, close, width_px, CHART_DOWNSAMPLING)
+        dates, close = dates[positions], close[positions]
+        line_series = {
+            name: indicator_series[name].to_numpy()[mask][positions]
+            for name, shown in (('ma_20', has_ma_20), ('ma_50', has_ma_50)) if shown
+        }
+        
+        # 点数较多时使用 WebGL 绘制
+        Scatter = go.Scattergl if len(positions) > CHART_WEBGL_THRESHOLD else go.Scatter
+        
         fig = go.Figure()
         
         # 添加收盘价线
-        fig.add_trace(go.Scatter(
-            x=hist_data.index,
-            y=hist_data['Close'],
+        fig.add_trace(Scatter(
+            x=dates,
+            y=close,
             mode='lines',
             name='Prix de Clôture',
             line=dict(color=color, width=2),
@@ -31,22 +159,20 @@ class Visualizer:
         ))
         
         # 添加移动平均线
-        if len(hist_data) >= 20:
-            ma_20 = hist_data['Close'].rolling(window=20).mean()
-            fig.add_trace(go.Scatter(
-                x=hist_data.index,
-                y=ma_20,
+        if has_ma_20:
+            fig.add_trace(Scatter(
+                x=dates,
+                y=line_series['ma_20'],
                 mode='lines',
                 name='MM20',
                 line=dict(color='orange', width=1, dash='dash'),
                 opacity=0.7
             ))
         
-        if len(hist_data) >= 50:
-            ma_50 = hist_data['Close'].rolling(window=50).mean()
-            fig.add_trace(go.Scatter(
-                x=hist_data.index,
-                y=ma_50,
+        if has_ma_50:
+            fig.add_trace(Scatter(
+                x=dates,
+                y=line_series['ma_50'],
                 mode='lines',
                 name='MM50',
                 line=dict(color='red', width=1, dash='dash'),
@@ -55,7 +181,7 @@ class Visualizer:
         
         # 更新布局
         fig.update_layout(
-            title=f"📈 Évolution du Prix de {company_name} (6 mois)",
+            title=f"📈 Évolution du Prix de {company_name} ({title_period})",
             xaxis_title="Date",
             yaxis_title="Prix (€)",
             height=400,
@@ -66,8 +192,11 @@ class Visualizer:
         
         return fig
 
+    @timed()
     def create_score_gauge(self, score, title, color):
         """创建得分仪表盘"""
+        import plotly.graph_objects as go
+        
         fig = go.Figure(go.Indicator(
             mode = "gauge+number",
             value = score,
@@ -89,6 +218,69 @@ class Visualizer:
         fig.update_layout(height=250, margin=dict(l=20, r=20, t=50, b=20))
         return fig
 
+    @timed()
+    def create_score_history_chart(self, history, company_name, color):
+        """总分随时间变化的曲线, 每个点的颜色表示当时的建议"""
+        import plotly.graph_objects as go
+        
+        fig = go.Figure()
+        
+        fig.add_trace(go.Scatter(
+            x=history['date'],
+            y=history['total_score'],
+            mode='lines+markers',
+            name='Score Total',
+            line=dict(color=color, width=2),
+            marker=dict(size=9, color=[recommendation_color(r) for r in history['recommendation']]),
+            text=history['recommendation'],
+            hovertemplate='<b>%{x|%d/%m/%Y}</b><br>Score: %{y:.2f}/5<br>%{text}<extra></extra>'
+        ))
+        
+        # 推荐阈值
+        fig.add_hline(y=3.5, line_dash="dot", line_color="green", annotation_text="ACHAT")
+        fig.add_hline(y=2.5, line_dash="dot", line_color="red", annotation_text="VENTE")
+        
+        fig.update_layout(
+            title=f"📈 Évolution du Score Total de {company_name}",
+            xaxis_title="Date",
+            yaxis_title="Score Total",
+            yaxis=dict(range=[0, 5]),
+            height=350,
+            showlegend=False,
+            template="plotly_white"
+        )
+        
+        return fig
+
+    @timed()
+    def display_score_history(self, history, result):
+        """显示评分历史"""
+        st.subheader("🕒 Historique des Scores")
+        
+        if len(history) < 2:
+            st.info("L'historique s'affichera dès que plusieurs analyses à des dates différentes auront été enregistrées.")
+            return
+        
+        from cache import content_hash
+        
+        key = ('score_history', content_hash(
+            history[['date', 'total_score', 'recommendation']], result['company_name'], result['color']
+        ))
+        self._plotly_chart(
+            self.cached_figure(key, lambda: self.create_score_history_chart(
+                history, result['company_name'], result['color']
+            )),
+            use_container_width=True
+        )
+        
+        # 建议的变化
+        changes = history[history['action'] != history['action'].shift()].iloc[1:]
+        if not changes.empty:
+            with st.expander(f"🔄 {len(changes)} changement(s) de recommandation"):
+                for _, change in changes.iloc[::-1].iterrows():
+                    st.write(f"**{change['date']:%d/%m/%Y}**: {change['recommendation']} (score {change['total_score']:.2f})")
+
+    @timed()
     def display_technical_analysis(self, result):
         """显示详细的技术分析"""
         st.markdown("---")
@@ -227,6 +419,7 @@ class Visualizer:
             with col2:
                 st.markdown(momentum_explanation['detailed_explanation'])
 
+    @timed()
     def display_fundamental_analysis(self, result):
         """显示详细的基本面分析"""
         st.markdown("---")
@@ -373,6 +566,7 @@ class Visualizer:
                 st.markdown(debt_explanation['detailed_explanation'])
                 st.caption("**Risque**: Un endettement excessif augmente la vulnérabilité aux hausses de taux d'intérêt")
 
+    @timed()
     def display_news_analysis(self, company_name):
         """显示公司新闻分析"""
         st.markdown("---")
@@ -520,6 +714,7 @@ des revenus supplémentaires à moyen terme.""",
         
         return news_db.get(company_name)
 
+    @timed()
     def display_welcome(self):
         """显示欢迎界面"""
         from config import COMPANIES, TEAM_MEMBERS
@@ -558,8 +753,79 @@ des revenus supplémentaires à moyen terme.""",
         st.markdown("---")
         st.info("💡 **Instructions**: Sélectionnez une entreprise dans la barre latérale et cliquez sur 'Lancer l'Analyse'")
 
-    def display_analysis_result(self, result):
-        """显示完整分析结果"""
+    @timed()
+    def display_recent_flips(self, flips, action="VENTE"):
+        """显示最近转为某个建议的 ticker"""
+        with st.expander(f"🔴 Passés à {action} cette semaine ({len(flips)})", expanded=not flips.empty):
+            if flips.empty:
+                st.write(f"Aucune entreprise n'est passée à {action} cette semaine.")
+                return
+            st.dataframe(
+                flips,
+                column_config={
+                    'ticker': "Ticker",
+                    'company_name': "Entreprise",
+                    'date': "Date",
+                    'previous': "Avant",
+                    'recommendation': "Recommandation",
+                    'total_score': st.column_config.NumberColumn("Score Total", format="%.2f")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+
+    @timed()
+    def display_screener(self, screener_result, universe_name, flips=None):
+        """显示筛选器排名表; flips 为最近转为 VENTE 的 ticker (来自 ScoreHistory)"""
+        table = screener_result['table']
+        st.subheader(f"🔎 Screener - {universe_name}")
+        
+        if flips is not None:
+            self.display_recent_flips(flips)
+        
+        if table.empty:
+            st.warning("Aucun résultat disponible pour cet univers.")
+        else:
+            # 过滤条件
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                recommendations = sorted(table['recommendation'].unique())
+                selected = st.multiselect("Recommandations:", recommendations, default=recommendations)
+            with col2:
+                min_score = st.slider("Score total minimum:", 0.0, 5.0, 0.0, 0.1)
+            
+            filtered = table[table['recommendation'].isin(selected) & (table['total_score'] >= min_score)]
+            st.caption(f"{len(filtered)} / {len(table)} entreprises")
+            
+            score_column = lambda label: st.column_config.ProgressColumn(
+                label, min_value=0, max_value=5, format="%.2f"
+            )
+            st.dataframe(
+                filtered[[
+                    'ticker', 'name', 'price', 'total_score', 'fundamental_score',
+                    'technical_score', 'recommendation'
+                ]],
+                column_config={
+                    'ticker': "Ticker",
+                    'name': "Entreprise",
+                    'price': st.column_config.NumberColumn("Prix (€)", format="%.2f"),
+                    'total_score': score_column("Score Total"),
+                    'fundamental_score': score_column("Score Fondamental"),
+                    'technical_score': score_column("Score Technique"),
+                    'recommendation': "Recommandation"
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+        
+        if screener_result['errors']:
+            with st.expander(f"⚠️ {len(screener_result['errors'])} ticker(s) sans données"):
+                for ticker, error in screener_result['errors'].items():
+                    st.write(f"**{ticker}**: {error}")
+
+    @timed()
+    def display_analysis_result(self, result, score_history=None):
+        """显示完整分析结果; score_history 为该 ticker 的评分历史 (来自 ScoreHistory)"""
         # 头部信息
         col1, col2, col3 = st.columns([2, 1, 1])
         
@@ -578,19 +844,13 @@ des revenus supplémentaires à moyen terme.""",
         
         # 添加价格曲线图
         if not result['hist_data'].empty:
-            price_chart = self.create_price_chart(
-                result['hist_data'], 
-                result['company_name'],
-                result['color']
-            )
+            price_chart = self._price_chart(result, self._price_range(result))
             if price_chart:
-                st.plotly_chart(price_chart, use_container_width=True)
+                self._plotly_chart(price_chart, use_container_width=True)
                 st.markdown("---")
         
         # 推荐卡片
-        rec_color = "green" if "ACHAT" in result['recommendation'] else \
-                   "orange" if "SURVEILLER" in result['recommendation'] else \
-                   "yellow" if "NE RIEN FAIRE" in result['recommendation'] else "red"
+        rec_color = recommendation_color(result['recommendation'])
         
         st.markdown(f"""
         <div style='background-color: {rec_color}20; padding: 20px; border-radius: 10px; border-left: 5px solid {rec_color}; margin: 20px 0;'>
@@ -605,8 +865,8 @@ des revenus supplémentaires à moyen terme.""",
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.plotly_chart(
-                self.create_score_gauge(
+            self._plotly_chart(
+                self._score_gauge(
                     result['fundamental_score'], 
                     "Score Fondamental", 
                     "blue"
@@ -615,8 +875,8 @@ des revenus supplémentaires à moyen terme.""",
             )
         
         with col2:
-            st.plotly_chart(
-                self.create_score_gauge(
+            self._plotly_chart(
+                self._score_gauge(
                     result['technical_score'], 
                     "Score Technique", 
                     "orange"
@@ -625,8 +885,8 @@ des revenus supplémentaires à moyen terme.""",
             )
         
         with col3:
-            st.plotly_chart(
-                self.create_score_gauge(
+            self._plotly_chart(
+                self._score_gauge(
                     result['total_score'], 
                     "Score Total", 
                     "green"
@@ -634,9 +894,28 @@ des revenus supplémentaires à moyen terme.""",
                 use_container_width=True
             )
         
+        if score_history is not None:
+            self.display_score_history(score_history, result)
+        
         # 显示详细分析
         self.display_fundamental_analysis(result)
         self.display_technical_analysis(result)
         
         # 添加新闻分析部分
-        self.display_news_analysis(result['company_name'])
\ No newline at end of file
+        self.display_news_analysis(result['company_name'])
+
+    def display_timings(self, trace):
+        """侧边栏调试面板: 本次渲染各阶段的耗时 (缩进表示嵌套)"""
+        with st.sidebar.expander(f"⏱️ Temps par étape ({trace.total_ms:.0f} ms)", expanded=True):
+            rows = [
+                {
+                    'Étape': " " * (row['depth'] - 1) + row['name'],
+                    'ms': row['ms'],
+                    '%': round(100 * row['ms'] / trace.total_ms, 1) if row['ms'] and trace.total_ms else None
+                }
+                for row in trace.rows()
+            ]
+            if not rows:
+                st.caption("Aucune étape mesurée.")
+                return
+            st.dataframe(rows, hide_index=True, use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+滚动前推 (walk-forward) 验证
+
+把历史切分成连续的 训练/测试 窗口: 在每个训练窗口上用参数优化器选出最佳参数,
+再用这组参数在紧随其后的测试窗口上回测, 各测试窗口的收益拼接成完整的样本外结果。
+
+    walk_forward = WalkForward(close, fundamental_scores, n_iter=200, seed=0)
+    result = walk_forward.run()
+    result['folds']      # 每个窗口的日期、最佳参数、样本内/样本外指标
+    result['portfolio']  # 拼接后的样本外组合指标
+
+各窗口在不同进程中并行计算。工作进程以内存映射方式打开同一个 PanelStore,
+只读取自己窗口的行, 不会把整个宽表复制到每个进程; 传入的是 DataFrame 时,
+先把它写入一个临时的 PanelStore。
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from backtest import Backtester, performance_metrics
+from panel_store import PanelStore
+from optimizer import (
+    DEFAULT_SPACE, ParameterOptimizer, SharedIndicators, default_params, grid_combinations,
+    random_combinations
+)
+from config import WALKFORWARD_TRAIN_BARS, WALKFORWARD_TEST_BARS, TRADING_DAYS_PER_YEAR
+
+
+def make_folds(n_bars, train_bars=WALKFORWARD_TRAIN_BARS, test_bars=WALKFORWARD_TEST_BARS,
+               anchored=False):
+    """按K线位置切分窗口, 返回 [(train_start, test_start, test_end), ...]
+
+    训练窗口为 [train_start, test_start), 测试窗口为 [test_start, test_end);
+    测试窗口首尾相接, 互不重叠。anchored=True 时训练窗口都从第一根K线开始 (扩展窗口)。
+    """
+    folds = []
+    test_start = train_bars
+    while test_start < n_bars:
+        train_start = 0 if anchored else test_start - train_bars
+        folds.append((train_start, test_start, min(test_start + test_bars, n_bars)))
+        test_start += test_bars
+    return folds
+
+
+def _python_value(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+_worker_state = None
+
+
+def _init_worker(panel_directory, tickers, settings):
+    global _worker_state
+    # 只读内存映射: 各进程共享操作系统的页缓存, 切片时才读取对应的行
+    _worker_state = (PanelStore(panel_directory), tickers, settings)
+
+
+def _run_fold(dates):
+    panel_store, tickers, settings = _worker_state
+    train_start, test_start, test_end = dates
+    close = panel_store.field('Close', tickers, start=train_start, end=test_end)
+    return run_fold(close, close.index.searchsorted(test_start), **settings)
+
+
+def run_fold(close, test_start, combinations, fundamental_scores=None, metric='sharpe',
+             backtest_options=None):
+    """在一个窗口上调参并做样本外回测
+
+    close: 训练窗口加测试窗口的收盘价 (日期 × ticker); test_start: 测试窗口第一行的位置
+    返回 (窗口摘要 dict, 测试窗口的组合日收益 Series, 测试窗口的组合敞口 Series)
+    """
+    index = close.index
+
+    # 1. 样本内: 训练窗口上回测全部组合, 选出最佳参数
+    ranking = ParameterOptimizer(
+        close.iloc[:test_start], fundamental_scores, metric=metric, workers=1,
+        backtest_options=backtest_options
+    ).evaluate(combinations)
+    # 按行取值会把整数参数转换成浮点数, 这里按列保留原类型
+    best = ranking.head(1).to_dict('records')[0]
+    params = {name: _python_value(best[name]) for name in default_params()}
+
+    # 2. 样本外: 训练窗口的数据只用于指标预热, 收益只统计测试窗口
+    backtester = Backtester(
+        buy_threshold=params['buy_threshold'],
+        sell_threshold=params['sell_threshold'],
+        fundamental_weight=params['fundamental_weight'],
+        technical_weight=1 - params['fundamental_weight'],
+        **(backtest_options or {})
+    )
+    result = backtester.run(
+        close, fundamental_scores, technical_scores=SharedIndicators(close).technical_scores(params),
+        ticker_metrics=False
+    )
+    test_rows = slice(test_start, None)
+    returns = result['portfolio_returns'].iloc[test_rows]
+    exposure = result['positions'].abs().mean(axis=1).iloc[test_rows]
+    test_metrics = performance_metrics(returns, exposure, backtester.periods_per_year).iloc[0]
+
+    summary = {
+        'train_start': index[0],
+        'test_start': index[test_start],
+        'test_end': index[-1],
+        f'train_{metric}': _python_value(best[metric]),
+        **{f'test_{name}': _python_value(value) for name, value in test_metrics.items()},
+        **params
+    }
+    return summary, returns, exposure
+
+
+class WalkForward:
+    """在价格宽表上做滚动前推验证
+
+    close: 收盘价宽表 (日期 × ticker), 或 PanelStore (此时用 tickers / start / end 选择数据)
+    combinations 为待选的参数组合 (默认从 DEFAULT_SPACE 随机抽取 n_iter 个,
+    指定 grid 时使用网格), 所有窗口使用同一批组合。
+    """
+
+    def __init__(self, close, fundamental_scores=None, train_bars=WALKFORWARD_TRAIN_BARS,
+                 test_bars=WALKFORWARD_TEST_BARS, anchored=False, grid=None, space=None,
+                 n_iter=100, seed=None, metric='sharpe', workers=None, backtest_options=None,
+                 tickers=None, start=None, end=None):
+        self.close = close
+        self.tickers = tickers
+        self.start = start
+        self.end = end
+        self.fundamental_scores = fundamental_scores
+        self.train_bars = train_bars
+        self.test_bars = test_bars
+        self.anchored = anchored
+        if grid is not None:
+            self.combinations = grid_combinations(grid)
+        else:
+            self.combinations = random_combinations(space or DEFAULT_SPACE, n_iter, seed)
+        self.metric = metric
+        self.workers = workers or os.cpu_count() or 1
+        self.backtest_options = backtest_options or {}
+
+    def _dates(self):
+        if isinstance(self.close, PanelStore):
+            return self.close.field('Close', start=self.start, end=self.end).index
+        return self.close.index
+
+    def folds(self):
+        """每个窗口的 (训练开始, 测试开始, 测试结束) 日期"""
+        dates = self._dates()
+        return [
+            (dates[train_start], dates[test_start], dates[test_end - 1])
+            for train_start, test_start, test_end in make_folds(
+                len(dates), self.train_bars, self.test_bars, self.anchored
+            )
+        ]
+
+    def run(self):
+        """并行计算全部窗口
+
+        返回 dict: folds (每个窗口一行), returns (拼接的样本外组合日收益),
+        equity (样本外净值), portfolio (样本外组合指标)
+        """
+        folds = self.folds()
+        if not folds:
+            raise ValueError(
+                f"Historique insuffisant: {len(self._dates())} séances pour une fenêtre "
+                f"d'apprentissage de {self.train_bars}"
+            )
+
+        settings = {
+            'combinations': self.combinations,
+            'fundamental_scores': self.fundamental_scores,
+            'metric': self.metric,
+            'backtest_options': self.backtest_options
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            if isinstance(self.close, PanelStore):
+                panel_store, tickers = self.close, self.tickers
+            else:
+                panel_store, tickers = PanelStore(directory), None
+                panel_store.write(pd.concat({'Close': self.close}, axis=1))
+
+            with ProcessPoolExecutor(
+                max_workers=min(self.workers, len(folds)), initializer=_init_worker,
+                initargs=(panel_store.directory, tickers, settings)
+            ) as executor:
+                outputs = list(executor.map(_run_fold, folds))
+
+        summaries, fold_returns, fold_exposure = zip(*outputs)
+        returns = pd.concat(fold_returns)
+        periods_per_year = self.backtest_options.get('periods_per_year', TRADING_DAYS_PER_YEAR)
+        portfolio = performance_metrics(
+            returns, pd.concat(fold_exposure), periods_per_year
+        ).iloc[0].to_dict()
+
+        return {
+            'folds': pd.DataFrame(list(summaries)),
+            'returns': returns,
+            'equity': (1 + returns).cumprod(),
+            'portfolio': portfolio
+        }